@@ -1,19 +1,126 @@
 import os
 import json
-from flask import Flask, jsonify, render_template, request
+import time
+import asyncio
+import threading
+import uuid
+import hashlib
+from flask import Flask, Response, jsonify, render_template, request, session, stream_with_context
 from dotenv import load_dotenv
 import openai
+from google_integration import google_integration
+from chat_tools import TOOLS, REGISTRY, execute_tool_calls
+from conversation_store import conversation_store
+from notion_mirror import main_mirror
+from http_cache import cache_policy, init_app as init_http_cache
+from job_queue import job_queue
+from intent_router import intent_router
+from response_cache import response_cache
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "super-agent-key")
+init_http_cache(app)
 
 # Initialize OpenAI
 openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
 
+# Build Google services off the request path
+google_integration.start_warmup()
+
+# One long-lived event loop for async helpers, so pooled clients survive across requests
+async_loop = asyncio.new_event_loop()
+threading.Thread(target=async_loop.run_forever, name="async-loop", daemon=True).start()
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the shared event loop from a Flask worker thread"""
+    return asyncio.run_coroutine_threadsafe(coro, async_loop).result(timeout)
+
+# Slow side effects (email, calendar, Notion writes) run on the shared loop's worker pool
+job_queue.start(async_loop)
+
+CHAT_MODEL = "gpt-4o"
+CHAT_SYSTEM_PROMPT = "You are OPS.PY, an AI assistant for Mohamed Dhaini's businesses: STR8N UP, CSSA, and MSA. You help with task management, email communication, and business operations. Be helpful and professional."
+
+def chat_session_id():
+    """Conversation key: the request's session_id, else one kept in the Flask session cookie"""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id') or request.args.get('session_id')
+    if session_id:
+        return str(session_id)
+    if 'chat_session' not in session:
+        session['chat_session'] = uuid.uuid4().hex
+    return session['chat_session']
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event"""
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+def with_tool_results(messages, content, tool_calls):
+    """Append the assistant's tool calls and their concurrently executed results"""
+    return messages + [{"role": "assistant", "content": content, "tool_calls": tool_calls}] + run_async(execute_tool_calls(tool_calls))
+
+def stream_chat(messages, on_complete=None):
+    """Yield completion tokens as SSE, finishing with a latency report
+
+    `on_complete` receives the final answer text and the names of any tools called
+    once the stream has finished.
+    """
+    started = time.perf_counter()
+    first_token_ms = None
+    tools_used = []
+    try:
+        # The first round may ask for tools; the follow-up answers from their results
+        for use_tools in (True, False):
+            stream = openai_client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7,
+                stream=True,
+                **({"tools": TOOLS} if use_tools else {})
+            )
+            content = ""
+            calls = {}
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                token = delta.content
+                if token:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                    content += token
+                    yield sse_event({"token": token})
+                for call in delta.tool_calls or []:
+                    entry = calls.setdefault(call.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                    if call.id:
+                        entry["id"] = call.id
+                    if call.function and call.function.name:
+                        entry["function"]["name"] += call.function.name
+                    if call.function and call.function.arguments:
+                        entry["function"]["arguments"] += call.function.arguments
+            if not calls:
+                break
+            tool_calls = [calls[index] for index in sorted(calls)]
+            tools_used += [call["function"]["name"] for call in tool_calls]
+            yield sse_event({"tools": [call["function"]["name"] for call in tool_calls]}, event="tools")
+            messages = with_tool_results(messages, content or None, tool_calls)
+        if on_complete and content:
+            on_complete(content, tools_used)
+        yield sse_event({
+            "status": "success",
+            "ttft_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }, event="done")
+    except Exception as e:
+        yield sse_event({"error": f"Chat error: {str(e)}"}, event="error")
+
 @app.route('/')
+@cache_policy("private, max-age=60")
 def dashboard():
     """Main dashboard"""
     return jsonify({
@@ -33,7 +140,34 @@ def dashboard():
         }
     })
 
+def template_mtime(name):
+    """Last-Modified source for a rendered template"""
+    return lambda: os.path.getmtime(os.path.join(app.root_path, app.template_folder, name))
+
+def build_version():
+    """Short content hash of static assets and templates, computed once per process"""
+    if not hasattr(build_version, "value"):
+        digest = hashlib.sha1()
+        for folder in (app.static_folder, os.path.join(app.root_path, app.template_folder)):
+            for root, _, files in sorted(os.walk(folder)):
+                for name in sorted(files):
+                    if name == "sw.js":
+                        continue
+                    with open(os.path.join(root, name), "rb") as f:
+                        digest.update(name.encode() + f.read())
+        build_version.value = digest.hexdigest()[:12]
+    return build_version.value
+
+@app.route('/sw.js')
+@cache_policy("no-cache")
+def service_worker():
+    """Service worker from the site root so it controls every page, stamped with the build version"""
+    with open(os.path.join(app.static_folder, 'sw.js')) as f:
+        script = f.read().replace('__BUILD_VERSION__', build_version())
+    return Response(script, mimetype='application/javascript', headers={"Service-Worker-Allowed": "/"})
+
 @app.route('/mobile')
+@cache_policy("no-cache", last_modified=template_mtime('mobile_dashboard.html'))
 def mobile_dashboard():
     """Mobile dashboard"""
     try:
@@ -47,36 +181,180 @@ def mobile_dashboard():
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
-    """Simple chat endpoint"""
+    """Chat endpoint - streams SSE tokens when asked, plain JSON otherwise"""
     try:
-        if not openai_client:
-            return jsonify({"error": "OpenAI not configured"}), 500
-            
         data = request.get_json()
         user_message = data.get('message', '')
         
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
-            
+        
+        session_id = chat_session_id()
+        streaming = data.get('stream') or 'text/event-stream' in request.headers.get('Accept', '')
+        started = time.perf_counter()
+        
+        history = conversation_store.messages(session_id)
+        # Only first-turn answers that consulted no tools are shared; data-dependent ones go through tools
+        use_cache = data.get('cache', True) is not False
+        
+        def remember(answer, tools=(), routed=None, cached=False):
+            conversation_store.append(session_id, "user", user_message)
+            conversation_store.append(session_id, "assistant", answer)
+            if cached:
+                return
+            intent_router.record(routed, (time.perf_counter() - started) * 1000)
+            if use_cache and not routed and not tools and not history:
+                response_cache.put(user_message, CHAT_SYSTEM_PROMPT, CHAT_MODEL, answer)
+        
+        # Well-structured read requests are answered by the matching web function directly
+        route = intent_router.route(user_message)
+        answer = run_async(REGISTRY[route["name"]](**route["arguments"])) if route else None
+        # A failed call is left to the LLM path, which can explain or work around it
+        if answer and not answer.startswith("❌"):
+            remember(answer, routed=route["name"])
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            if streaming:
+                body = sse_event({"token": answer}) + sse_event(
+                    {"status": "success", "routed": route, "ttft_ms": total_ms, "total_ms": total_ms}, event="done")
+                return Response(body, mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+            return jsonify({"response": answer, "status": "success", "routed": route, "total_ms": total_ms})
+        
+        # Cached answers carry no context, so they are only read at the start of a conversation,
+        # just as only first-turn answers are written
+        hit = None
+        if use_cache and not history:
+            hit = response_cache.get(user_message, CHAT_SYSTEM_PROMPT, CHAT_MODEL)
+        if hit:
+            answer = hit["answer"]
+            remember(answer, cached=True)
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            if streaming:
+                body = sse_event({"token": answer}) + sse_event(
+                    {"status": "success", "cached": True, "ttft_ms": total_ms, "total_ms": total_ms}, event="done")
+                return Response(body, mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+            return jsonify({"response": answer, "status": "success", "cached": True, "total_ms": total_ms})
+        
+        if not openai_client:
+            return jsonify({"error": "OpenAI not configured"}), 500
+        
+        messages = (
+            [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+            + history
+            + [{"role": "user", "content": user_message}]
+        )
+        
+        if streaming:
+            return Response(
+                stream_with_context(stream_chat(messages, on_complete=remember)),
+                mimetype='text/event-stream',
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
         response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are OPS.PY, an AI assistant for Mohamed Dhaini's businesses: STR8N UP, CSSA, and MSA. You help with task management, email communication, and business operations. Be helpful and professional."},
-                {"role": "user", "content": user_message}
-            ],
+            model=CHAT_MODEL,
+            messages=messages,
             max_tokens=500,
-            temperature=0.7
+            temperature=0.7,
+            tools=TOOLS
         )
         
+        reply = response.choices[0].message
+        tools = []
+        if reply.tool_calls:
+            tool_calls = [call.model_dump() for call in reply.tool_calls]
+            tools = [call["function"]["name"] for call in tool_calls]
+            response = openai_client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=with_tool_results(messages, reply.content, tool_calls),
+                max_tokens=500,
+                temperature=0.7
+            )
+        
+        answer = response.choices[0].message.content
+        if answer:
+            remember(answer, tools)
+        
         return jsonify({
-            "response": response.choices[0].message.content,
-            "status": "success"
+            "response": answer,
+            "status": "success",
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
         })
         
     except Exception as e:
         return jsonify({"error": f"Chat error: {str(e)}"}), 500
 
+@app.route('/api/conversation', methods=['GET', 'DELETE'])
+def conversation():
+    """Windowed chat history for this session; DELETE starts over"""
+    session_id = chat_session_id()
+    if request.method == 'DELETE':
+        conversation_store.clear(session_id)
+        return jsonify({"status": "success", "history": []})
+    return jsonify({"history": conversation_store.history(session_id)})
+
+@app.route('/api/chat/cache', methods=['DELETE'])
+def chat_cache():
+    """Invalidate one prompt's cached answer, or all of them when no message is given"""
+    data = request.get_json(silent=True) or {}
+    response_cache.invalidate(data.get('message'), CHAT_SYSTEM_PROMPT, CHAT_MODEL)
+    return jsonify({"status": "success", "cache": response_cache.stats()})
+
+@app.route('/api/overview')
+@cache_policy("private, max-age=15, stale-while-revalidate=30", last_modified=main_mirror.last_synced)
+def overview():
+    """Per-business task summary for the dashboard cards, read from the Notion mirror"""
+    counts = {}
+    if main_mirror.enabled:
+        try:
+            run_async(main_mirror.ensure_fresh(), timeout=20)
+            counts = main_mirror.count_by_business()
+        except Exception as e:
+            return jsonify({"error": f"Overview error: {str(e)}"}), 500
+    businesses = {}
+    for name in ("STR8N UP", "CSSA", "MSA"):
+        business = counts.get(name, {})
+        businesses[name] = {
+            "status": "Active" if business.get("open") else "No open tasks",
+            "total_tasks": business.get("open", 0),
+            "priority_items": business.get("high_priority", 0),
+            "upcoming_deadlines": business.get("due_soon", 0)
+        }
+    last_synced = main_mirror.last_synced() if main_mirror.enabled else 0
+    return jsonify({
+        "businesses": businesses,
+        "last_updated": int((last_synced or time.time()) * 1000)
+    })
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a write action ({action, args}) and answer 202 with its job id"""
+    data = request.get_json(silent=True) or {}
+    try:
+        job_id = job_queue.enqueue(data.get('action', ''), data.get('args') or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    status_url = f"/api/jobs/{job_id}"
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": status_url}), 202, {"Location": status_url}
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a queued job: queued, running, succeeded or failed"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found", "status": 404}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "action": job["action"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created": job["created"],
+        "updated": job["updated"]
+    })
+
 @app.route('/api/status')
+@cache_policy("private, max-age=10")
 def status():
     """Status check"""
     return jsonify({
@@ -86,11 +364,16 @@ def status():
         "services": {
             "openai": bool(os.getenv("OPENAI_API_KEY")),
             "notion": bool(os.getenv("NOTION_TOKEN")),
-            "google": bool(os.getenv("GOOGLE_CREDENTIALS_BASE64"))
-        }
+            "google": bool(os.getenv("GOOGLE_CREDENTIALS_BASE64")),
+            "google_ready": google_integration.ready
+        },
+        "jobs": job_queue.stats(),
+        "intents": intent_router.stats(),
+        "chat_cache": response_cache.stats()
     })
 
 @app.route('/health')
+@cache_policy("no-cache")
 def health():
     """Health check"""
     return jsonify({"status": "healthy"})
@@ -0,0 +1,397 @@
+"""Throughput and latency benchmarks against local stand-ins for Notion, Google and OpenAI.
+
+Runs fake Notion, Gmail, Calendar and OpenAI servers with configurable latency
+and Notion-style rate limiting, points web_functions.py and api.py at them, and
+drives the public entry points at a given concurrency:
+
+    python benchmark.py --concurrency 8 --requests 40
+    python benchmark.py --only retrieve_notion_data_web chat_stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+from aiohttp import web
+
+FAKE_HOST = "127.0.0.1"
+
+
+class Latency:
+    def __init__(self, mean_ms: float, jitter_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    async def wait(self):
+        delay = max(0.0, random.gauss(self.mean_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: float):
+        """Server-side token bucket answering 429 like Notion does"""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.rejected += 1
+        return False
+
+
+class FakeServices:
+    def __init__(self, args):
+        """aiohttp app mimicking the Notion, Gmail, Calendar and OpenAI endpoints we use"""
+        self.notion_latency = Latency(args.notion_ms, args.notion_ms / 4)
+        self.google_latency = Latency(args.google_ms, args.google_ms / 4)
+        self.openai_ttft = Latency(args.openai_ttft_ms, args.openai_ttft_ms / 4)
+        self.openai_token_ms = args.openai_token_ms
+        self.openai_tokens = args.openai_tokens
+        self.notion_limiter = RateLimiter(args.notion_rate, args.notion_rate)
+        self.pages = [self._page(i) for i in range(args.notion_pages)]
+        self.messages = [self._message(i) for i in range(args.gmail_messages)]
+        now = datetime.now(timezone.utc)
+        self.events = [self._event(i, now) for i in range(args.calendar_events)]
+        self.port = 0
+
+    @staticmethod
+    def _page(i: int) -> Dict[str, Any]:
+        edited = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+        return {
+            "object": "page",
+            "id": str(uuid.UUID(int=i)),
+            "url": f"https://www.notion.so/bench-{i}",
+            "created_time": edited.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "last_edited_time": edited.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "properties": {
+                "Task": {"type": "title", "title": [{"plain_text": f"Task {i}", "text": {"content": f"Task {i}"}}]},
+                "Business": {"type": "select", "select": {"name": ["STR8N UP", "CSSA", "MSA"][i % 3]}},
+                "Status": {"type": "select", "select": {"name": ["Not Started", "In Progress", "Done"][i % 3]}},
+                "Priority": {"type": "select", "select": {"name": ["High", "Medium", "Low"][i % 3]}},
+                "Due Date": {"type": "date", "date": {"start": f"2025-02-{i % 28 + 1:02d}"}},
+            },
+        }
+
+    @staticmethod
+    def _message(i: int) -> Dict[str, Any]:
+        return {
+            "id": f"msg{i:05d}",
+            "threadId": f"thr{i:05d}",
+            "snippet": f"Hi Mohamed, following up on item {i} ...",
+            "labelIds": ["INBOX", "UNREAD"],
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": [
+                    {"name": "Subject", "value": f"Follow-up {i}"},
+                    {"name": "From", "value": f"parent{i}@example.com"},
+                    {"name": "Date", "value": "Mon, 2 Jun 2025 09:00:00 +1000"},
+                ],
+                "body": {"data": "SGVsbG8gd29ybGQ="},
+            },
+        }
+
+    @staticmethod
+    def _event(i: int, now: datetime) -> Dict[str, Any]:
+        start = now + timedelta(hours=3 * i)
+        return {
+            "id": f"evt{i:05d}",
+            "status": "confirmed",
+            "summary": f"Meeting {i}",
+            "location": "Sydney" if i % 2 else "",
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+        }
+
+    # Notion
+
+    async def notion_query(self, request):
+        await self.notion_latency.wait()
+        if not self.notion_limiter.allow():
+            return web.json_response({"object": "error", "status": 429, "code": "rate_limited",
+                                      "message": "Rate limited"}, status=429, headers={"Retry-After": "1"})
+        body = await request.json()
+        start = int(body.get("start_cursor") or 0)
+        size = int(body.get("page_size") or 100)
+        results = self.pages[start:start + size]
+        has_more = start + size < len(self.pages)
+        return web.json_response({"object": "list", "results": results, "has_more": has_more,
+                                  "next_cursor": str(start + size) if has_more else None})
+
+    async def notion_create(self, request):
+        await self.notion_latency.wait()
+        if not self.notion_limiter.allow():
+            return web.json_response({"object": "error", "status": 429, "code": "rate_limited",
+                                      "message": "Rate limited"}, status=429, headers={"Retry-After": "1"})
+        body = await request.json()
+        page = self._page(len(self.pages))
+        page["properties"].update(body.get("properties", {}))
+        self.pages.append(page)
+        return web.json_response(page)
+
+    # Gmail
+
+    def _gmail_message(self, message_id: str, message_format: str) -> Dict[str, Any]:
+        index = int(message_id[3:])
+        message = dict(self.messages[index])
+        if message_format == "metadata":
+            message["payload"] = {"headers": message["payload"]["headers"]}
+        return message
+
+    async def gmail_list(self, request):
+        await self.google_latency.wait()
+        limit = int(request.query.get("maxResults", 100))
+        return web.json_response({"messages": [{"id": m["id"], "threadId": m["threadId"]}
+                                               for m in self.messages[:limit]]})
+
+    async def gmail_profile(self, request):
+        await self.google_latency.wait()
+        return web.json_response({"emailAddress": "bench@example.com", "historyId": "1000"})
+
+    async def gmail_history(self, request):
+        await self.google_latency.wait()
+        return web.json_response({"history": [], "historyId": "1000"})
+
+    async def gmail_get(self, request):
+        await self.google_latency.wait()
+        return web.json_response(self._gmail_message(request.match_info["id"],
+                                                     request.query.get("format", "full")))
+
+    # Calendar
+
+    async def calendar_list(self, request):
+        await self.google_latency.wait()
+        if request.query.get("syncToken"):
+            return web.json_response({"items": [], "nextSyncToken": request.query["syncToken"]})
+        return web.json_response({"items": self.events, "nextSyncToken": "bench-sync-1"})
+
+    async def calendar_insert(self, request):
+        await self.google_latency.wait()
+        event = await request.json()
+        event.update({"id": f"evt{len(self.events):05d}", "status": "confirmed",
+                      "htmlLink": "https://calendar.google.com/bench"})
+        self.events.append(event)
+        return web.json_response(event)
+
+    async def calendar_freebusy(self, request):
+        await self.google_latency.wait()
+        body = await request.json()
+        busy = [{"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]} for e in self.events[:20]]
+        return web.json_response({"calendars": {item["id"]: {"busy": busy} for item in body.get("items", [])}})
+
+    # OpenAI
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        await self.openai_ttft.wait()
+        words = [f"word{i} " for i in range(self.openai_tokens)]
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(self.openai_token_ms * len(words) / 1000)
+            return web.json_response({
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(words)}}],
+                "usage": {"prompt_tokens": 50, "completion_tokens": len(words), "total_tokens": 50 + len(words)},
+            })
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in words:
+            chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created,
+                     "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.openai_token_ms / 1000)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/notion/v1/databases/{id}/query", self.notion_query)
+        app.router.add_post("/notion/v1/pages", self.notion_create)
+        app.router.add_get("/gmail/v1/users/me/profile", self.gmail_profile)
+        app.router.add_get("/gmail/v1/users/me/history", self.gmail_history)
+        app.router.add_get("/gmail/v1/users/me/messages", self.gmail_list)
+        app.router.add_get("/gmail/v1/users/me/messages/{id}", self.gmail_get)
+        app.router.add_get("/calendar/v3/calendars/{calendar}/events", self.calendar_list)
+        app.router.add_post("/calendar/v3/calendars/{calendar}/events", self.calendar_insert)
+        app.router.add_post("/calendar/v3/freeBusy", self.calendar_freebusy)
+        app.router.add_post("/openai/v1/chat/completions", self.chat_completions)
+        return app
+
+    def start(self) -> str:
+        """Serve on a background thread with its own loop, so blocking clients can't stall it"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            runner = web.AppRunner(self.app(), access_log=None)
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, FAKE_HOST, 0)
+            loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="fake-services", daemon=True).start()
+        ready.wait()
+        return f"http://{FAKE_HOST}:{self.port}"
+
+
+def start_api_server(base_url: str) -> str:
+    """Run api.py's Flask app on a threaded werkzeug server pointed at the fakes"""
+    from werkzeug.serving import make_server
+    import api
+
+    server = make_server(FAKE_HOST, 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    return f"http://{FAKE_HOST}:{server.server_port}"
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def drive(name: str, call: Callable[[int], Awaitable[Any]], concurrency: int,
+                requests: int) -> Dict[str, Any]:
+    """Run `requests` calls with `concurrency` in flight; report ops/s and latency percentiles"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                result = await call(i)
+                if isinstance(result, str) and result.startswith("❌"):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "name": name,
+        "requests": requests,
+        "errors": errors,
+        "ops_per_s": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+    }
+
+
+def scenarios(api_url: str) -> Dict[str, Callable[[int], Awaitable[Any]]]:
+    import aiohttp
+    import web_functions
+
+    async def chat(i: int, stream: bool):
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{api_url}/api/chat",
+                                    json={"message": f"draft a status update for CSSA #{i}", "stream": stream, "cache": False}) as response:
+                body = await response.read()
+                if response.status != 200:
+                    raise RuntimeError(body[:200])
+                return body
+
+    return {
+        "create_notion_task_web": lambda i: web_functions.create_notion_task_web(f"Bench task {i}", "CSSA", "High"),
+        "retrieve_notion_data_web": lambda i: web_functions.retrieve_notion_data_web(["ALL", "CSSA", "MSA"][i % 3]),
+        "read_recent_emails_web": lambda i: web_functions.read_recent_emails_web(max_results=20),
+        "get_upcoming_events_web": lambda i: web_functions.get_upcoming_events_web(days_ahead=7),
+        "chat": lambda i: chat(i, stream=False),
+        "chat_stream": lambda i: chat(i, stream=True),
+    }
+
+
+def configure_environment(base_url: str, workdir: str):
+    """Point every client at the fakes; must run before the app modules are imported"""
+    os.environ.update({
+        "NOTION_TOKEN": "bench-token",
+        "NOTION_API_URL": f"{base_url}/notion/v1",
+        "NOTION_MAIN_DATABASE_ID": "bench-main",
+        "NOTION_ORGANISATION_ID": "bench-org",
+        "NOTION_MIRROR_PATH": os.path.join(workdir, "notion_mirror.db"),
+        "WRITE_OUTBOX_PATH": os.path.join(workdir, "outbox.db"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.db"),
+        "GMAIL_INDEX_PATH": os.path.join(workdir, "gmail_index.db"),
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"{base_url}/openai/v1",
+        "GOOGLE_CALENDAR_API_URL": f"{base_url}/calendar/v3",
+        "GMAIL_API_URL": f"{base_url}/gmail/v1",
+    })
+
+
+async def main(args):
+    fakes = FakeServices(args)
+    base_url = fakes.start()
+    workdir = tempfile.mkdtemp(prefix="super-agent-bench-")
+    configure_environment(base_url, workdir)
+
+    from google_api import GoogleClient
+    from google_integration import google_integration
+    google_integration.attach_client(GoogleClient(token="bench-token"))
+    api_url = start_api_server(base_url)
+
+    results = []
+    for name, call in scenarios(api_url).items():
+        if args.only and name not in args.only:
+            continue
+        results.append(await drive(name, call, args.concurrency, args.requests))
+
+    columns = ["name", "requests", "errors", "ops_per_s", "p50_ms", "p95_ms", "p99_ms", "mean_ms"]
+    print(" ".join(f"{column:>24}" if i == 0 else f"{column:>10}" for i, column in enumerate(columns)))
+    for result in results:
+        print(" ".join(f"{result[column]:>24}" if i == 0 else f"{result[column]:>10}"
+                       for i, column in enumerate(columns)))
+    print(f"Notion 429s issued by the stand-in: {fakes.notion_limiter.rejected}")
+
+    from notion_api import notion
+    await notion.close()
+    await google_integration.client.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20, help="calls per scenario")
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--notion-ms", type=float, default=120)
+    parser.add_argument("--notion-rate", type=float, default=3, help="stand-in rate limit (req/s)")
+    parser.add_argument("--notion-pages", type=int, default=250)
+    parser.add_argument("--google-ms", type=float, default=90)
+    parser.add_argument("--gmail-messages", type=int, default=200)
+    parser.add_argument("--calendar-events", type=int, default=100)
+    parser.add_argument("--openai-ttft-ms", type=float, default=400)
+    parser.add_argument("--openai-token-ms", type=float, default=15)
+    parser.add_argument("--openai-tokens", type=int, default=120)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
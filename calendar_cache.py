@@ -0,0 +1,158 @@
+import asyncio
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from google_api import GoogleAPIError
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CALENDAR_TIMEZONE = ZoneInfo("Australia/Sydney")
+# How far back a full sync reaches; past events are only needed for today's view
+CALENDAR_HISTORY_DAYS = 1
+
+
+def _timestamp(when: Dict[str, str]) -> float:
+    """Epoch seconds for a Calendar start/end; all-day dates are Sydney midnight"""
+    if when.get("dateTime"):
+        return datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00")).timestamp()
+    return datetime.fromisoformat(when["date"]).replace(tzinfo=CALENDAR_TIMEZONE).timestamp()
+
+
+def format_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a Calendar API event to the fields the agent reports"""
+    start = event['start'].get('dateTime', event['start'].get('date'))
+    return {
+        'id': event['id'],
+        'title': event.get('summary', 'No Title'),
+        'start': start,
+        'location': event.get('location', ''),
+        'description': event.get('description', ''),
+        'attendees': [attendee.get('email') for attendee in event.get('attendees', [])]
+    }
+
+
+class CalendarCache:
+    def __init__(self, calendar_id: str = "primary", max_staleness: float = 30.0,
+                 history_days: float = CALENDAR_HISTORY_DAYS):
+        """Local copy of a calendar kept current with syncToken incremental sync
+
+        Only events ending after `history_days` before the last full sync are held,
+        so recurring series are not expanded back to their first occurrence.
+        """
+        self.calendar_id = calendar_id
+        self.max_staleness = max_staleness
+        self.history_days = history_days
+        # Lower bound of the full sync behind the current sync token, sent on its pages only
+        self.time_min: Optional[str] = None
+        self.sync_token: Optional[str] = None
+        self.last_sync = 0.0
+        # id -> (start_ts, end_ts, formatted event), plus a start-sorted index over it
+        self._events: Dict[str, Tuple[float, float, Dict[str, Any]]] = {}
+        self._index: List[Tuple[float, str]] = []
+        self._max_span = 0.0
+        self._lock = threading.RLock()
+        self._sync_lock = asyncio.Lock()
+
+    def _remove(self, event_id: str):
+        entry = self._events.pop(event_id, None)
+        if entry:
+            position = bisect.bisect_left(self._index, (entry[0], event_id))
+            if position < len(self._index) and self._index[position] == (entry[0], event_id):
+                del self._index[position]
+
+    def upsert(self, event: Dict[str, Any]):
+        """Apply one event from the API; cancelled events are dropped"""
+        with self._lock:
+            self._remove(event['id'])
+            if event.get('status') == 'cancelled' or 'start' not in event:
+                return
+            start_ts = _timestamp(event['start'])
+            end_ts = _timestamp(event.get('end', event['start']))
+            self._events[event['id']] = (start_ts, end_ts, format_event(event))
+            bisect.insort(self._index, (start_ts, event['id']))
+            self._max_span = max(self._max_span, end_ts - start_ts)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._index.clear()
+            self._max_span = 0.0
+            self.sync_token = None
+            self.time_min = None
+
+    async def sync(self, client):
+        """Pull changes since the last syncToken, or everything if there is none"""
+        async with self._sync_lock:
+            await self._sync(client)
+
+    async def _sync(self, client):
+        try:
+            await self._sync_pages(client, self.sync_token)
+        except GoogleAPIError as e:
+            if e.status != 410:
+                raise
+            # Sync token expired: drop local state and start over
+            logger.info("Calendar sync token expired, running full sync")
+            self.clear()
+            await self._sync_pages(client, None)
+        self.last_sync = time.time()
+
+    async def _sync_pages(self, client, sync_token: Optional[str]):
+        if not sync_token:
+            start = datetime.now(timezone.utc) - timedelta(days=self.history_days)
+            self.time_min = start.strftime("%Y-%m-%dT%H:%M:%SZ")
+        page_token = None
+        while True:
+            params = {
+                'singleEvents': True,
+                'maxResults': 2500,
+            }
+            # Events.list rejects timeMin alongside syncToken; the token carries the
+            # full sync's window forward on its own
+            if sync_token:
+                params['syncToken'] = sync_token
+            else:
+                params['timeMin'] = self.time_min
+            if page_token:
+                params['pageToken'] = page_token
+            response = await client.list_events(self.calendar_id, **params)
+            for event in response.get('items', []):
+                self.upsert(event)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                self.sync_token = response.get('nextSyncToken')
+                return
+
+    def is_fresh(self, max_staleness: Optional[float] = None) -> bool:
+        window = self.max_staleness if max_staleness is None else max_staleness
+        return bool(self.sync_token) and time.time() - self.last_sync <= window
+
+    async def ensure_fresh(self, client, max_staleness: Optional[float] = None):
+        if self.is_fresh(max_staleness):
+            return
+        async with self._sync_lock:
+            # Callers that queued behind a sync reuse its result
+            if not self.is_fresh(max_staleness):
+                await self._sync(client)
+
+    def window(self, time_min: float, time_max: float,
+               max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Events overlapping [time_min, time_max), ordered by start time"""
+        with self._lock:
+            # Anything starting earlier than time_min - max_span has already ended
+            low = bisect.bisect_left(self._index, (time_min - self._max_span, ""))
+            high = bisect.bisect_left(self._index, (time_max, ""))
+            events = []
+            for start_ts, event_id in self._index[low:high]:
+                _, end_ts, event = self._events[event_id]
+                if end_ts > time_min or (end_ts == start_ts and start_ts >= time_min):
+                    events.append(event)
+                    if max_results and len(events) >= max_results:
+                        break
+            return events
@@ -0,0 +1,102 @@
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Tuple
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CALENDAR_TIMEZONE = ZoneInfo("Australia/Sydney")
+# Daily prayer windows and the Friday Jumu'ah window, in local time ("HH:MM-HH:MM,...")
+PRAYER_TIMES = os.getenv("PRAYER_TIMES", "12:30-13:00,15:45-16:15")
+JUMUAH_TIME = os.getenv("JUMUAH_TIME", "12:15-13:45")
+
+Interval = Tuple[datetime, datetime]
+
+
+def parse_windows(spec: str) -> List[Tuple[time, time]]:
+    """Parse "HH:MM-HH:MM,HH:MM-HH:MM" into (start, end) times"""
+    windows = []
+    for part in filter(None, (chunk.strip() for chunk in spec.split(","))):
+        start, end = part.split("-")
+        windows.append((time.fromisoformat(start.strip()), time.fromisoformat(end.strip())))
+    return windows
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse an ISO date or datetime; naive values are Sydney local time"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=CALENDAR_TIMEZONE)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort and merge overlapping or touching intervals"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _days(range_start: datetime, range_end: datetime) -> Iterable[date]:
+    day = range_start.astimezone(CALENDAR_TIMEZONE).date()
+    last = range_end.astimezone(CALENDAR_TIMEZONE).date()
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def _local(day: date, at: time) -> datetime:
+    return datetime.combine(day, at, tzinfo=CALENDAR_TIMEZONE)
+
+
+def blocked_intervals(range_start: datetime, range_end: datetime,
+                      working_hours: Tuple[time, time] = (time(9), time(17)),
+                      working_days: Iterable[int] = range(5),
+                      avoid_prayer_times: bool = True) -> List[Interval]:
+    """Time outside working hours plus prayer windows, for every day in the range"""
+    prayer_windows = parse_windows(PRAYER_TIMES) if avoid_prayer_times else []
+    jumuah_windows = parse_windows(JUMUAH_TIME) if avoid_prayer_times else []
+    working_days = set(working_days)
+    blocked = []
+    for day in _days(range_start, range_end):
+        if day.weekday() not in working_days:
+            blocked.append((_local(day, time(0)), _local(day + timedelta(days=1), time(0))))
+            continue
+        blocked.append((_local(day, time(0)), _local(day, working_hours[0])))
+        blocked.append((_local(day, working_hours[1]), _local(day + timedelta(days=1), time(0))))
+        for start, end in prayer_windows + (jumuah_windows if day.weekday() == 4 else []):
+            blocked.append((_local(day, start), _local(day, end)))
+    return blocked
+
+
+def find_free_slots(busy: Iterable[Interval], range_start: datetime, range_end: datetime,
+                    duration: timedelta, max_results: int = 5,
+                    granularity: timedelta = timedelta(minutes=15),
+                    working_hours: Tuple[time, time] = (time(9), time(17)),
+                    working_days: Iterable[int] = range(5),
+                    avoid_prayer_times: bool = True) -> List[Interval]:
+    """Earliest `max_results` slots of `duration` that avoid every busy and blocked interval"""
+    unavailable = merge_intervals(list(busy) + blocked_intervals(
+        range_start, range_end, working_hours, working_days, avoid_prayer_times
+    ))
+    step = granularity.total_seconds()
+    slots: List[Interval] = []
+    cursor = range_start
+    for busy_start, busy_end in unavailable + [(range_end, range_end)]:
+        gap_end = min(busy_start, range_end)
+        # Round the gap start up to the slot granularity
+        offset = cursor.timestamp() % step
+        slot_start = cursor + timedelta(seconds=step - offset) if offset else cursor
+        while slot_start + duration <= gap_end:
+            slots.append((slot_start, slot_start + duration))
+            if len(slots) >= max_results:
+                return slots
+            slot_start += duration
+        cursor = max(cursor, busy_end)
+        if cursor >= range_end:
+            break
+    return slots
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from job_queue import job_queue
+import web_functions
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Budget for all tool calls of one assistant message, well inside Vercel's 60s maxDuration
+TOOL_TURN_DEADLINE = float(os.getenv("CHAT_TOOL_DEADLINE", "20"))
+
+BUSINESS = {"type": "string", "enum": ["STR8N UP", "CSSA", "MSA", "ALL"]}
+
+
+def _tool(name: str, description: str, properties: Dict[str, Any], required: List[str] = ()) -> Dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": list(required)},
+        },
+    }
+
+
+TOOLS = [
+    _tool("retrieve_notion_data_web", "List tasks from the Super Agent Hub Notion database",
+          {"business": BUSINESS, "status": {"type": "string"}, "limit": {"type": "integer"}}),
+    _tool("create_notion_task_web", "Create a task in the Super Agent Hub Notion database",
+          {"title": {"type": "string"}, "project": BUSINESS,
+           "priority": {"type": "string", "enum": ["High", "Medium", "Low"]},
+           "due_date": {"type": "string", "description": "YYYY-MM-DD"},
+           "description": {"type": "string"}}, ["title"]),
+    _tool("create_notion_tasks_web", "Create several tasks in the Super Agent Hub Notion database at once",
+          {"tasks": {"type": "array", "items": {
+              "type": "object",
+              "properties": {"title": {"type": "string"}, "project": BUSINESS,
+                             "priority": {"type": "string", "enum": ["High", "Medium", "Low"]},
+                             "due_date": {"type": "string", "description": "YYYY-MM-DD"},
+                             "description": {"type": "string"}},
+              "required": ["title"]}}}, ["tasks"]),
+    _tool("update_notion_tasks_web", "Change status, priority or due date on existing Notion tasks, by exact title",
+          {"updates": {"type": "array", "items": {
+              "type": "object",
+              "properties": {"title": {"type": "string"}, "status": {"type": "string"},
+                             "priority": {"type": "string", "enum": ["High", "Medium", "Low"]},
+                             "due_date": {"type": "string", "description": "YYYY-MM-DD"}},
+              "required": ["title"]}}}, ["updates"]),
+    _tool("query_business_data_web", "Summarise one business or all of them",
+          {"business": BUSINESS, "data_type": {"type": "string"}}),
+    _tool("check_ndis_compliance_web", "Check CSSA NDIS compliance status", {"area": {"type": "string"}}),
+    _tool("get_upcoming_events_web", "List upcoming Google Calendar events, or those in a date range",
+          {"days_ahead": {"type": "integer"}, "max_results": {"type": "integer"},
+           "start_date": {"type": "string", "description": "YYYY-MM-DD"},
+           "end_date": {"type": "string", "description": "YYYY-MM-DD, inclusive"}}),
+    _tool("check_calendar_availability_web", "Check whether a time window is free",
+          {"start_datetime": {"type": "string"}, "end_datetime": {"type": "string"}},
+          ["start_datetime", "end_datetime"]),
+    _tool("find_free_slots_web", "Find the earliest free meeting slots in a date range",
+          {"start_datetime": {"type": "string"}, "end_datetime": {"type": "string"},
+           "duration_minutes": {"type": "integer"}, "max_results": {"type": "integer"}},
+          ["start_datetime", "end_datetime"]),
+    _tool("create_google_calendar_event_web", "Create a Google Calendar event",
+          {"title": {"type": "string"}, "start_datetime": {"type": "string"}, "end_datetime": {"type": "string"},
+           "description": {"type": "string"}, "location": {"type": "string"}, "attendees": {"type": "string"}},
+          ["title", "start_datetime", "end_datetime"]),
+    _tool("read_recent_emails_web", "Read recent Gmail messages",
+          {"max_results": {"type": "integer"}, "query": {"type": "string"}}),
+    _tool("generate_invoices_batch_web", "Generate one invoice per client from a period's hours records",
+          {"records": {"type": "array", "items": {
+              "type": "object",
+              "properties": {"client_name": {"type": "string"}, "hours": {"type": "number"},
+                             "rate": {"type": "number"}, "service": {"type": "string"},
+                             "date": {"type": "string", "description": "YYYY-MM-DD"}},
+              "required": ["client_name", "hours"]}},
+           "business": BUSINESS, "default_rate": {"type": "number"},
+           "date": {"type": "string", "description": "Invoice date, YYYY-MM-DD"}}, ["records"]),
+    _tool("send_email_web", "Send an email",
+          {"to_email": {"type": "string"}, "subject": {"type": "string"}, "message": {"type": "string"},
+           "cc_email": {"type": "string"}}, ["to_email", "subject", "message"]),
+]
+
+REGISTRY: Dict[str, Callable[..., Awaitable[str]]] = {
+    tool["function"]["name"]: getattr(web_functions, tool["function"]["name"]) for tool in TOOLS
+}
+
+
+# Tools with side effects; queued as background jobs instead of running on the request
+WRITE_TOOLS = frozenset({
+    "create_notion_task_web",
+    "create_notion_tasks_web",
+    "update_notion_tasks_web",
+    "create_google_calendar_event_web",
+    "generate_invoices_batch_web",
+    "send_email_web",
+})
+
+
+def _start(call: Dict[str, Any]) -> Optional[asyncio.Task]:
+    func = REGISTRY.get(call["function"]["name"])
+    try:
+        coro = func(**json.loads(call["function"].get("arguments") or "{}"))
+    except (TypeError, ValueError):
+        return None
+    return asyncio.ensure_future(coro)
+
+
+async def execute_tool_calls(tool_calls: List[Dict[str, Any]],
+                             deadline: float = TOOL_TURN_DEADLINE) -> List[Dict[str, Any]]:
+    """Run the tool calls from one assistant message and return their results
+
+    `tool_calls` are OpenAI-format dicts ({id, function: {name, arguments}}). Returns
+    one tool-role message per call, in order. Read-only calls run concurrently under a
+    shared deadline; those still running at the deadline are cancelled and reported.
+    Write calls are queued on the job queue in the order given, so a slow send or create
+    never holds the request, and the model is told each job's id and status.
+    """
+    started = time.perf_counter()
+    tasks: List[Optional[asyncio.Task]] = [None] * len(tool_calls)
+    invalid = set()
+    for index, call in enumerate(tool_calls):
+        if call["function"]["name"] in WRITE_TOOLS:
+            continue
+        tasks[index] = _start(call)
+        if tasks[index] is None:
+            invalid.add(index)
+
+    pending = [task for task in tasks if task is not None]
+    if pending:
+        _, still_running = await asyncio.wait(pending, timeout=deadline)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+
+    queued: Dict[int, str] = {}
+    for index, call in enumerate(tool_calls):
+        name = call["function"]["name"]
+        if name not in WRITE_TOOLS:
+            continue
+        try:
+            queued[index] = job_queue.enqueue(name, json.loads(call["function"].get("arguments") or "{}"))
+        except ValueError:
+            invalid.add(index)
+
+    messages = []
+    for index, (call, task) in enumerate(zip(tool_calls, tasks)):
+        name = call["function"]["name"]
+        if index in queued:
+            content = (f"🕒 {name} queued as job {queued[index]} (status: queued); "
+                       f"progress at /api/jobs/{queued[index]}")
+        elif index in invalid or task is None:
+            content = f"❌ Unknown tool or invalid arguments: {name}"
+        elif task.cancelled():
+            content = f"⏱️ {name} did not finish within {deadline:.0f}s"
+        elif task.exception() is not None:
+            content = f"❌ {name} failed: {task.exception()}"
+        else:
+            content = str(task.result())
+        messages.append({"role": "tool", "tool_call_id": call["id"], "content": content})
+
+    logger.info(f"Executed {len(tool_calls)} tool calls in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return messages
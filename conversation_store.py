@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "500"))
+# Prompt tokens allowed for history per request (turns plus the rolling summary)
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "300"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token plus per-message overhead)"""
+    return len(text) // 4 + 4
+
+
+class Turn:
+    __slots__ = ("role", "content", "timestamp", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.timestamp = time.time()
+        self.tokens = estimate_tokens(content)
+
+
+class Conversation:
+    __slots__ = ("turns", "summary", "tokens")
+
+    def __init__(self):
+        self.turns: Deque[Turn] = deque()
+        self.summary = ""
+        self.tokens = 0
+
+    def append(self, turn: Turn):
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        # Fold the oldest turns into the summary until the window fits the budget
+        while self.turns and self.tokens + estimate_tokens(self.summary) > HISTORY_TOKEN_BUDGET and len(self.turns) > 1:
+            self._fold(self.turns.popleft())
+
+    def _fold(self, turn: Turn):
+        self.tokens -= turn.tokens
+        if turn.role != "user":
+            return
+        # Keep the gist of what was asked: the first sentence, clipped
+        gist = turn.content.strip().split("\n")[0].split(". ")[0][:160]
+        self.summary = f"{self.summary} | {gist}" if self.summary else gist
+        max_chars = SUMMARY_TOKEN_BUDGET * 4
+        if len(self.summary) > max_chars:
+            self.summary = "…" + self.summary[-max_chars:]
+
+
+class ConversationStore:
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        """Per-session chat history, LRU-capped, each session windowed to a token budget"""
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[Conversation]:
+        conversation = self._sessions.get(session_id)
+        if conversation is None and create:
+            conversation = self._sessions[session_id] = Conversation()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if conversation is not None:
+            self._sessions.move_to_end(session_id)
+        return conversation
+
+    def append(self, session_id: str, role: str, content: str):
+        with self._lock:
+            self._get(session_id, create=True).append(Turn(role, content))
+
+    def messages(self, session_id: str) -> List[Dict[str, str]]:
+        """OpenAI-format messages for the windowed history, summary first"""
+        with self._lock:
+            conversation = self._get(session_id)
+            if conversation is None:
+                return []
+            messages = []
+            if conversation.summary:
+                messages.append({"role": "system",
+                                 "content": f"Earlier in this conversation Mohamed asked about: {conversation.summary}"})
+            messages.extend({"role": turn.role, "content": turn.content} for turn in conversation.turns)
+            return messages
+
+    def history(self, session_id: str) -> List[Dict[str, Any]]:
+        """Windowed turns with timestamps, for the dashboard"""
+        with self._lock:
+            conversation = self._get(session_id)
+            if conversation is None:
+                return []
+            return [{"role": turn.role, "content": turn.content, "timestamp": turn.timestamp * 1000}
+                    for turn in conversation.turns]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+# Initialize global instance
+conversation_store = ConversationStore()
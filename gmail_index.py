@@ -0,0 +1,374 @@
+import asyncio
+import os
+import re
+import shlex
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from google_api import GoogleAPIError
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+GMAIL_INDEX_PATH = os.getenv("GMAIL_INDEX_PATH", os.path.join(tempfile.gettempdir(), "super_agent_gmail.db"))
+# A full sync indexes this many days of mail, up to GMAIL_INDEX_LIMIT messages
+GMAIL_INDEX_DAYS = int(os.getenv("GMAIL_INDEX_DAYS", "30"))
+GMAIL_INDEX_LIMIT = int(os.getenv("GMAIL_INDEX_LIMIT", "1000"))
+GMAIL_INDEX_MAX_STALENESS = float(os.getenv("GMAIL_INDEX_MAX_STALENESS", "5"))
+
+METADATA_HEADERS = ["Subject", "From", "Date"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER NOT NULL,
+    subject TEXT,
+    sender TEXT,
+    date TEXT,
+    snippet TEXT,
+    labels TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages (internal_date);
+CREATE TABLE IF NOT EXISTS gmail_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    history_id TEXT,
+    last_sync REAL,
+    last_full_sync REAL
+);
+CREATE TABLE IF NOT EXISTS complete_labels (
+    label TEXT PRIMARY KEY
+);
+"""
+
+# Gmail search operators answered from the index; anything else goes to the API
+LABEL_TERMS = {
+    "is:unread": "UNREAD", "is:starred": "STARRED", "is:important": "IMPORTANT",
+    "in:inbox": "INBOX", "in:sent": "SENT", "in:spam": "SPAM", "in:trash": "TRASH",
+    "label:inbox": "INBOX", "label:unread": "UNREAD", "label:starred": "STARRED", "label:important": "IMPORTANT",
+}
+# Labels checked for completeness on a full sync: if no message older than the indexed
+# window carries one, every match of that label is in the index
+COMPLETENESS_TERMS = {"UNREAD": "is:unread", "STARRED": "is:starred", "IMPORTANT": "is:important"}
+_NEWER_THAN = re.compile(r"^newer_than:(\d+)([dmy])$")
+# Only the epoch-seconds form; Gmail reads YYYY/MM/DD dates in its own timezone
+_EPOCH_BOUND = re.compile(r"^(after|before):(\d{9,})$")
+_UNIT_SECONDS = {"d": 86400, "m": 31 * 86400, "y": 365 * 86400}
+
+
+def _labels(label_ids: List[str]) -> str:
+    # Space-delimited with padding so a label can be matched with LIKE '% NAME %'
+    return f" {' '.join(label_ids)} "
+
+
+def _message_row(message: Dict[str, Any]) -> tuple:
+    headers = {h["name"]: h["value"] for h in message.get("payload", {}).get("headers", [])}
+    return (
+        message["id"],
+        message.get("threadId"),
+        int(message.get("internalDate", 0)),
+        headers.get("Subject", "No Subject"),
+        headers.get("From", "Unknown Sender"),
+        headers.get("Date", ""),
+        message.get("snippet", ""),
+        _labels(message.get("labelIds", [])),
+    )
+
+
+def compile_query(query: str, now: Optional[float] = None) -> Optional[Tuple[str, List[Any], Optional[int], Set[str]]]:
+    """Translate a Gmail search into (WHERE clause, params, newer_than cutoff in ms, required labels)
+
+    None if the index can't answer it: free words (Gmail also searches bodies, which
+    the index doesn't hold), spam or trash (never fully indexed) and other operators.
+    """
+    try:
+        terms = shlex.split(query or "")
+    except ValueError:
+        return None
+    clauses: List[str] = []
+    params: List[Any] = []
+    since: Optional[int] = None
+    labels: Set[str] = set()
+    for term in terms:
+        lowered = term.lower()
+        newer = _NEWER_THAN.match(lowered)
+        bound = _EPOCH_BOUND.match(lowered)
+        if lowered in LABEL_TERMS:
+            if LABEL_TERMS[lowered] in ("SPAM", "TRASH"):
+                return None
+            clauses.append("labels LIKE ?")
+            params.append(f"% {LABEL_TERMS[lowered]} %")
+            labels.add(LABEL_TERMS[lowered])
+        elif lowered == "is:read":
+            clauses.append("labels NOT LIKE '% UNREAD %'")
+        elif newer:
+            cutoff = int(((now or time.time()) - int(newer.group(1)) * _UNIT_SECONDS[newer.group(2)]) * 1000)
+            clauses.append("internal_date >= ?")
+            params.append(cutoff)
+            since = cutoff if since is None else max(since, cutoff)
+        elif bound:
+            cutoff = int(bound.group(2)) * 1000
+            if bound.group(1) == "after":
+                clauses.append("internal_date >= ?")
+                since = cutoff if since is None else max(since, cutoff)
+            else:
+                clauses.append("internal_date < ?")
+            params.append(cutoff)
+        elif lowered.startswith(("from:", "subject:")) and ":" in term and term.split(":", 1)[1]:
+            column = "sender" if lowered.startswith("from:") else "subject"
+            clauses.append(f"{column} LIKE ?")
+            params.append(f"%{term.split(':', 1)[1]}%")
+        else:
+            return None
+    # Gmail leaves spam and trash out of searches unless asked
+    clauses.append("labels NOT LIKE '% SPAM %' AND labels NOT LIKE '% TRASH %'")
+    return " AND ".join(clauses), params, since, labels
+
+
+class GmailIndex:
+    def __init__(self, path: str = GMAIL_INDEX_PATH, max_staleness: float = GMAIL_INDEX_MAX_STALENESS,
+                 days: int = GMAIL_INDEX_DAYS, limit: int = GMAIL_INDEX_LIMIT):
+        """Local index of recent Gmail headers, snippets and labels
+
+        Kept current with users.history.list from the last historyId. A full sync runs
+        in the background on first use, or when Gmail reports that history id as expired;
+        until it finishes, ensure_fresh reports the index as not ready.
+        """
+        self.path = path
+        self.max_staleness = max_staleness
+        self.days = days
+        self.limit = limit
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._full_sync_task: Optional[asyncio.Task] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def _state(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT history_id, last_sync, last_full_sync FROM gmail_state WHERE id = 1"
+            ).fetchone()
+        if not row:
+            return {"history_id": None, "last_sync": 0.0, "last_full_sync": 0.0}
+        return {"history_id": row[0], "last_sync": row[1] or 0.0, "last_full_sync": row[2] or 0.0}
+
+    def _save_state(self, history_id: str, full: bool):
+        now = time.time()
+        state = self._state()
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO gmail_state VALUES (1, ?, ?, ?)",
+                       (history_id, now, now if full else state["last_full_sync"]))
+            db.commit()
+
+    def _upsert(self, messages: List[Dict[str, Any]], replace: bool = False,
+                complete_labels: Optional[List[str]] = None):
+        """Write messages; with replace, swap out the whole index and its complete labels in one transaction"""
+        with self._lock:
+            db = self._db()
+            if replace:
+                db.execute("DELETE FROM messages")
+                db.execute("DELETE FROM complete_labels")
+                db.executemany("INSERT INTO complete_labels VALUES (?)", [(label,) for label in complete_labels or ()])
+            db.executemany("INSERT OR REPLACE INTO messages VALUES (?,?,?,?,?,?,?,?)",
+                           [_message_row(message) for message in messages])
+            db.commit()
+
+    def _drop_complete(self, db: sqlite3.Connection, label_sets: List[str]):
+        """Forget completeness of any label carried by a message outside the index"""
+        labels = {label for labels in label_sets for label in labels.split()}
+        db.executemany("DELETE FROM complete_labels WHERE label = ?", [(label,) for label in labels])
+
+    def complete_labels(self) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._db().execute("SELECT label FROM complete_labels")}
+
+    async def sync(self, client):
+        async with self._sync_lock:
+            await self._sync(client)
+
+    async def _sync(self, client):
+        history_id = self._state()["history_id"]
+        if history_id:
+            try:
+                await self._sync_history(client, history_id)
+                return
+            except GoogleAPIError as e:
+                if e.status != 404:
+                    raise
+                logger.info("Gmail history id expired, running full sync")
+        await self._full_sync(client)
+
+    async def _full_sync(self, client):
+        # Take the history id first so changes made during the listing are replayed next time
+        history_id = (await client.get_profile())["historyId"]
+        message_ids: List[str] = []
+        page_token = None
+        while len(message_ids) < self.limit:
+            response = await client.list_messages(f"newer_than:{self.days}d",
+                                                  min(500, self.limit - len(message_ids)), page_token)
+            message_ids.extend(message["id"] for message in response.get("messages", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+        fetched = await client.get_messages(message_ids, format="metadata", metadata_headers=METADATA_HEADERS)
+        covered_since = int((time.time() - self.days * 86400) * 1000)
+        if len(message_ids) >= self.limit and fetched:
+            covered_since = max(covered_since, min(int(m.get("internalDate", 0)) for m in fetched.values()))
+        # Changes after the history id above are replayed by the next delta, so this can't miss any
+        complete = []
+        for label, term in COMPLETENESS_TERMS.items():
+            older = await client.list_messages(f"{term} before:{covered_since // 1000}", 1)
+            if not older.get("messages"):
+                complete.append(label)
+        # Readers see the old index or the new one, never an empty table in between
+        self._upsert(list(fetched.values()), replace=True, complete_labels=complete)
+        self._save_state(history_id, full=True)
+        logger.info(f"Gmail index full sync: {len(fetched)} messages, complete labels {complete}")
+
+    async def _sync_history(self, client, history_id: str):
+        added: Dict[str, None] = {}
+        deleted: List[str] = []
+        relabelled: Dict[str, List[str]] = {}
+        page_token = None
+        while True:
+            response = await client.list_history(history_id, page_token)
+            for record in response.get("history", []):
+                for change in record.get("messagesAdded", []):
+                    added[change["message"]["id"]] = None
+                for change in record.get("messagesDeleted", []):
+                    message_id = change["message"]["id"]
+                    added.pop(message_id, None)
+                    relabelled.pop(message_id, None)
+                    deleted.append(message_id)
+                for change in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+                    # History carries the message's full label set after the change
+                    relabelled[change["message"]["id"]] = change["message"].get("labelIds", [])
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                new_history_id = response.get("historyId", history_id)
+                break
+
+        fetched = await client.get_messages(list(added), format="metadata",
+                                            metadata_headers=METADATA_HEADERS) if added else {}
+        cutoff = int((time.time() - self.days * 86400) * 1000)
+        with self._lock:
+            db = self._db()
+            db.executemany("DELETE FROM messages WHERE id = ?", [(message_id,) for message_id in deleted])
+            outside = []
+            for message_id, labels in relabelled.items():
+                if message_id in fetched:
+                    continue
+                if not db.execute("UPDATE messages SET labels = ? WHERE id = ?",
+                                  (_labels(labels), message_id)).rowcount:
+                    # An older message outside the index gained or kept these labels
+                    outside.append(_labels(labels))
+            # Messages ageing out of the window take their labels' completeness with them
+            outside.extend(row[0] for row in db.execute(
+                "SELECT labels FROM messages WHERE internal_date < ?", (cutoff,)))
+            self._drop_complete(db, outside)
+            db.execute("DELETE FROM messages WHERE internal_date < ?", (cutoff,))
+            db.commit()
+        if fetched:
+            self._upsert(list(fetched.values()))
+        self._save_state(new_history_id, full=False)
+        if added or deleted or relabelled:
+            logger.info(f"Gmail index delta: +{len(fetched)} -{len(deleted)} ~{len(relabelled)}")
+
+    def is_fresh(self, max_staleness: Optional[float] = None) -> bool:
+        window = self.max_staleness if max_staleness is None else max_staleness
+        state = self._state()
+        return bool(state["history_id"]) and time.time() - state["last_sync"] <= window
+
+    def _start_full_sync(self, client):
+        """Build the index in the background, unless that is already under way"""
+        task = self._full_sync_task
+        loop = asyncio.get_running_loop()
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._full_sync_task = loop.create_task(self._background_full_sync(client))
+
+    async def _background_full_sync(self, client):
+        try:
+            async with self._sync_lock:
+                await self._full_sync(client)
+        except Exception as e:
+            logger.warning(f"Gmail index full sync failed: {e}")
+
+    def _forget_history(self):
+        with self._lock:
+            db = self._db()
+            db.execute("UPDATE gmail_state SET history_id = NULL WHERE id = 1")
+            db.commit()
+
+    async def ensure_fresh(self, client, max_staleness: Optional[float] = None) -> bool:
+        """Bring the index up to date; False while it is still being built in the background
+
+        Only a cheap history delta ever runs inline; callers use the live API meanwhile.
+        """
+        if not self._state()["history_id"]:
+            self._start_full_sync(client)
+            return False
+        if self.is_fresh(max_staleness):
+            return True
+        async with self._sync_lock:
+            # Callers that queued behind a sync reuse its result
+            history_id = self._state()["history_id"]
+            if not history_id:
+                return False
+            if self.is_fresh(max_staleness):
+                return True
+            try:
+                await self._sync_history(client, history_id)
+                return True
+            except GoogleAPIError as e:
+                if e.status != 404:
+                    raise
+        logger.info("Gmail history id expired, rebuilding the index in the background")
+        self._forget_history()
+        self._start_full_sync(client)
+        return False
+
+    def _covered_since(self, now: Optional[float] = None) -> int:
+        """Epoch ms from which the index holds every message (bar spam and trash)"""
+        with self._lock:
+            count, oldest = self._db().execute("SELECT COUNT(*), MIN(internal_date) FROM messages").fetchone()
+        window = int(((now or time.time()) - self.days * 86400) * 1000)
+        # A full sync that hit the message limit stops short of the window
+        return max(window, oldest or 0) if count >= self.limit else window
+
+    def search(self, query: str = "", max_results: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Newest indexed messages matching a Gmail query, or None if it needs the API
+
+        A full page of matches is always the true newest, since anything not indexed is
+        older than the window. A short page is only trusted when the query itself is
+        limited to the indexed window, or requires a label no older message carries.
+        """
+        compiled = compile_query(query)
+        if compiled is None:
+            return None
+        where, params, since, labels = compiled
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT id, subject, sender, date, snippet, labels FROM messages WHERE {where} "
+                f"ORDER BY internal_date DESC LIMIT ?", params + [max_results]
+            ).fetchall()
+        if (len(rows) < max_results and (since is None or since < self._covered_since())
+                and not labels & self.complete_labels()):
+            return None
+        return [{"id": row[0], "subject": row[1], "sender": row[2], "date": row[3],
+                 "snippet": row[4], "labels": row[5].split()} for row in rows]
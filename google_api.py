@@ -0,0 +1,215 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+import aiohttp
+from dotenv import load_dotenv
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+CALENDAR_API_URL = os.getenv("GOOGLE_CALENDAR_API_URL", "https://www.googleapis.com/calendar/v3")
+GMAIL_API_URL = os.getenv("GMAIL_API_URL", "https://gmail.googleapis.com/gmail/v1")
+GOOGLE_MAX_RETRIES = 3
+# Refresh access tokens this long before Google says they expire
+TOKEN_REFRESH_MARGIN = 300
+# In-flight messages.get calls per read; replaces one multipart batch round trip
+GMAIL_CONCURRENCY = int(os.getenv("GMAIL_CONCURRENCY", "10"))
+
+
+class GoogleAPIError(Exception):
+    """Raised when a Google API answers with a non-2xx status"""
+
+    def __init__(self, status: int, message: str, reason: str = "", body: Optional[Dict[str, Any]] = None):
+        super().__init__(f"Google API error {status}: {message}")
+        self.status = status
+        self.message = message
+        self.reason = reason
+        self.body = body or {}
+
+
+class AccessTokenCache:
+    def __init__(self, credentials=None, token: Optional[str] = None):
+        """Service-account access token, refreshed once per hour instead of per request
+
+        With a fixed `token` (e.g. for local stand-ins) no refresh ever happens.
+        """
+        self.credentials = credentials
+        self.token = token
+        self.expires_at = float("inf") if token else 0.0
+        self._lock = threading.Lock()
+
+    def valid(self) -> bool:
+        return bool(self.token) and time.time() < self.expires_at - TOKEN_REFRESH_MARGIN
+
+    def _refresh(self) -> str:
+        with self._lock:
+            if self.valid():
+                return self.token
+            from google.auth.transport.requests import Request
+            # Signing the JWT grant and exchanging it is a single hourly call; keep it off the loop
+            self.credentials.refresh(Request())
+            self.token = self.credentials.token
+            expiry = self.credentials.expiry
+            # google-auth reports expiry as a naive UTC datetime
+            self.expires_at = expiry.replace(tzinfo=timezone.utc).timestamp() if expiry else time.time() + 3600
+            logger.info("Google access token refreshed")
+            return self.token
+
+    async def get(self, force: bool = False) -> str:
+        if force and self.credentials is not None:
+            self.expires_at = 0.0
+        if self.valid():
+            return self.token
+        if self.credentials is None:
+            raise GoogleAPIError(401, "No Google credentials configured")
+        return await asyncio.to_thread(self._refresh)
+
+
+class GoogleClient:
+    def __init__(self, credentials=None, token: Optional[str] = None, pool_size: int = 20,
+                 timeout: float = 15.0, keepalive: float = 60.0):
+        """Async Calendar and Gmail client sharing one keep-alive connection pool per event loop"""
+        self.tokens = AccessTokenCache(credentials, token)
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=5.0)
+        self.keepalive = keepalive
+        # One session per event loop; a session may only be used and closed on its own loop
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    @property
+    def configured(self) -> bool:
+        return self.tokens.credentials is not None or bool(self.tokens.token)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the running loop's pooled session, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        # Sessions of loops that have since closed can't be awaited any more; just let them go
+        for stale in [other for other in self._sessions if other.is_closed()]:
+            del self._sessions[stale]
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    keepalive_timeout=self.keepalive,
+                    ttl_dns_cache=300
+                )
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def request(self, method: str, url: str, params: Optional[Any] = None,
+                      json: Optional[Dict[str, Any]] = None,
+                      idempotent: Optional[bool] = None) -> Dict[str, Any]:
+        """Send an authorized request and return the decoded JSON body
+
+        A 401 refreshes the token once. 429 and 5xx answers are retried with backoff,
+        except for non-idempotent requests (POST unless `idempotent` says otherwise),
+        which might already have taken effect.
+        """
+        if idempotent is None:
+            idempotent = method != "POST"
+        session = await self._get_session()
+        refreshed = False
+        for attempt in range(GOOGLE_MAX_RETRIES + 1):
+            token = await self.tokens.get()
+            headers = {"Authorization": f"Bearer {token}"}
+            async with session.request(method, url, params=params, json=json, headers=headers) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = {"error": {"message": await response.text()}}
+                if response.status == 401 and not refreshed and self.tokens.credentials is not None:
+                    refreshed = True
+                    await self.tokens.get(force=True)
+                    continue
+                if (response.status == 429 or response.status >= 500) and idempotent and attempt < GOOGLE_MAX_RETRIES:
+                    retry_after = float(response.headers.get("Retry-After", 2 ** attempt))
+                    logger.warning(f"Google API {response.status}, retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                if response.status >= 300:
+                    error = (data or {}).get("error", {}) if isinstance(data, dict) else {}
+                    if not isinstance(error, dict):
+                        error = {"message": str(error)}
+                    reason = ((error.get("errors") or [{}])[0]).get("reason", "")
+                    raise GoogleAPIError(response.status, error.get("message", "Unknown error"), reason, data)
+                return data or {}
+
+    # Calendar
+
+    async def list_events(self, calendar_id: str, **params) -> Dict[str, Any]:
+        params = {key: str(value).lower() if isinstance(value, bool) else value for key, value in params.items()}
+        return await self.request("GET", f"{CALENDAR_API_URL}/calendars/{calendar_id}/events", params=params)
+
+    async def insert_event(self, calendar_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        # Safe to retry: the event carries a client-chosen id, so a repeat answers 409
+        return await self.request("POST", f"{CALENDAR_API_URL}/calendars/{calendar_id}/events", json=event,
+                                  idempotent="id" in event)
+
+    async def get_event(self, calendar_id: str, event_id: str) -> Dict[str, Any]:
+        return await self.request("GET", f"{CALENDAR_API_URL}/calendars/{calendar_id}/events/{event_id}")
+
+    async def freebusy(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request("POST", f"{CALENDAR_API_URL}/freeBusy", json=body, idempotent=True)
+
+    # Gmail
+
+    async def get_profile(self) -> Dict[str, Any]:
+        return await self.request("GET", f"{GMAIL_API_URL}/users/me/profile")
+
+    async def list_messages(self, query: str = "", max_results: int = 10,
+                            page_token: Optional[str] = None) -> Dict[str, Any]:
+        params = {"maxResults": max_results}
+        if query:
+            params["q"] = query
+        if page_token:
+            params["pageToken"] = page_token
+        return await self.request("GET", f"{GMAIL_API_URL}/users/me/messages", params=params)
+
+    async def list_history(self, start_history_id: str, page_token: Optional[str] = None) -> Dict[str, Any]:
+        """Mailbox changes since `start_history_id`; a 404 means that id has expired"""
+        params: List[tuple] = [("startHistoryId", start_history_id), ("maxResults", 500)]
+        params.extend(("historyTypes", kind) for kind in ("messageAdded", "messageDeleted", "labelAdded", "labelRemoved"))
+        if page_token:
+            params.append(("pageToken", page_token))
+        return await self.request("GET", f"{GMAIL_API_URL}/users/me/history", params=params)
+
+    async def get_message(self, message_id: str, format: str = "full",
+                          metadata_headers: Optional[List[str]] = None) -> Dict[str, Any]:
+        params: List[tuple] = [("format", format)]
+        params.extend(("metadataHeaders", header) for header in metadata_headers or [])
+        return await self.request("GET", f"{GMAIL_API_URL}/users/me/messages/{message_id}", params=params)
+
+    async def get_messages(self, message_ids: List[str], format: str = "full",
+                           metadata_headers: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Fetch many messages over the pooled connections; failed ids are logged and left out"""
+        semaphore = asyncio.Semaphore(GMAIL_CONCURRENCY)
+
+        async def fetch(message_id):
+            async with semaphore:
+                try:
+                    return message_id, await self.get_message(message_id, format, metadata_headers)
+                except GoogleAPIError as e:
+                    logger.error(f"Error processing email {message_id}: {e}")
+                    return message_id, None
+
+        results = await asyncio.gather(*(fetch(message_id) for message_id in message_ids))
+        return {message_id: message for message_id, message in results if message is not None}
+
+    async def send_message(self, raw: str) -> Dict[str, Any]:
+        return await self.request("POST", f"{GMAIL_API_URL}/users/me/messages/send", json={"raw": raw})
+
+    async def close(self):
+        """Close the running loop's session; sessions of other loops are left alone"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
@@ -1,14 +1,19 @@
+import asyncio
 import json
 import os
 from datetime import datetime, timedelta
 import base64
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
+import threading
+import time
+from calendar_cache import CALENDAR_TIMEZONE, CalendarCache
+from gmail_index import GmailIndex, compile_query
+from google_api import GoogleAPIError, GoogleClient
+from write_outbox import outbox
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,62 +21,127 @@ logger = logging.getLogger(__name__)
 
 class GoogleIntegration:
     def __init__(self, credentials_file="google-credentials.json"):
-        """Initialize Google API services using service account credentials"""
-        self.calendar_service = None
-        self.gmail_service = None
-        self.gmail_enabled = False
-        self.calendar_enabled = False
-        
+        """Set up Google API access; credentials are loaded lazily on first use"""
+        self.credentials_file = credentials_file
+        self.credentials = None
+        self.client = GoogleClient()
+        self._gmail_enabled = False
+        self._calendar_enabled = False
+        self._initialized = False
+        self._gmail_checked = False
+        self._lock = threading.RLock()
+        self._gmail_check = None
+        self._warmup_thread = None
+        self.calendar_cache = CalendarCache('primary')
+        self.gmail_index = GmailIndex()
+
+    @property
+    def ready(self) -> bool:
+        """True once credentials are loaded and the Gmail check has run"""
+        return self._initialized and self._gmail_checked
+
+    @property
+    def calendar_enabled(self) -> bool:
+        self._ensure_initialized()
+        return self._calendar_enabled
+
+    @property
+    def gmail_enabled(self) -> bool:
+        self._ensure_initialized()
+        return self._gmail_enabled
+
+    @gmail_enabled.setter
+    def gmail_enabled(self, value: bool):
+        self._gmail_enabled = value
+
+    def attach_client(self, client: GoogleClient, calendar: bool = True, gmail: bool = True):
+        """Use a prebuilt client instead of the credentials file (e.g. pointed at local stand-ins)"""
+        with self._lock:
+            self.client = client
+            self._calendar_enabled = calendar
+            self._gmail_enabled = gmail
+            self._initialized = True
+            self._gmail_checked = True
+
+    def start_warmup(self):
+        """Load credentials and fetch the first access token in a background thread"""
+        if self.ready or (self._warmup_thread and self._warmup_thread.is_alive()):
+            return
+        self._warmup_thread = threading.Thread(target=self._warmup, name="google-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def _warmup(self):
+        self._ensure_initialized()
+        if self.client.configured and not self._gmail_checked:
+            asyncio.run(self._check_and_close())
+
+    async def _check_and_close(self):
+        # Runs on the warm-up thread's own loop, so only that loop's session is closed
         try:
-            if not os.path.exists(credentials_file):
-                logger.warning(f"Google credentials file {credentials_file} not found. Google services will be disabled.")
+            await self.ensure_gmail_checked()
+        finally:
+            await self.client.close()
+
+    def _ensure_initialized(self):
+        """Load service account credentials for the async Calendar and Gmail client"""
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
                 return
-                
-            self.credentials = service_account.Credentials.from_service_account_file(
-                credentials_file,
-                scopes=[
-                    'https://www.googleapis.com/auth/calendar',
-                    'https://www.googleapis.com/auth/gmail.readonly',
-                    'https://www.googleapis.com/auth/gmail.send',
-                    'https://www.googleapis.com/auth/gmail.modify'
-                ]
-            )
-            
-            # Build Google API services with error handling
             try:
-                self.calendar_service = build('calendar', 'v3', credentials=self.credentials)
-                self.calendar_enabled = True
-                logger.info("Google Calendar service initialized successfully")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Calendar service: {e}")
+                if not os.path.exists(self.credentials_file):
+                    logger.warning(f"Google credentials file {self.credentials_file} not found. Google services will be disabled.")
+                    self._gmail_checked = True
+                    return
+                    
+                self.credentials = service_account.Credentials.from_service_account_file(
+                    self.credentials_file,
+                    scopes=[
+                        'https://www.googleapis.com/auth/calendar',
+                        'https://www.googleapis.com/auth/gmail.readonly',
+                        'https://www.googleapis.com/auth/gmail.send',
+                        'https://www.googleapis.com/auth/gmail.modify'
+                    ]
+                )
+                self.client = GoogleClient(credentials=self.credentials)
+                self._calendar_enabled = True
+                # Optimistic until the profile check says otherwise
+                self._gmail_enabled = True
+                logger.info("Google Calendar and Gmail client initialized successfully")
                 
-            try:
-                self.gmail_service = build('gmail', 'v1', credentials=self.credentials)
-                # Test Gmail service with a simple call
-                self._test_gmail_service()
             except Exception as e:
-                logger.warning(f"Gmail service initialization failed: {e}")
-                self.gmail_service = None
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize Google services: {e}")
+                logger.error(f"Failed to initialize Google services: {e}")
+                self._gmail_checked = True
+            finally:
+                self._initialized = True
+
+    async def ensure_gmail_checked(self):
+        """Run the Gmail profile check once; concurrent callers share it"""
+        self._ensure_initialized()
+        if self._gmail_checked:
+            return
+        if self._gmail_check is None or self._gmail_check.get_loop() is not asyncio.get_running_loop():
+            self._gmail_check = asyncio.ensure_future(self._test_gmail_service())
+        await asyncio.shield(self._gmail_check)
             
-    def _test_gmail_service(self):
+    async def _test_gmail_service(self):
         """Test Gmail service availability"""
         try:
-            if self.gmail_service:
-                # Try to get user profile (minimal permission test)
-                profile = self.gmail_service.users().getProfile(userId='me').execute()
-                self.gmail_enabled = True
-                logger.info("Gmail service test successful")
+            # Try to get user profile (minimal permission test)
+            profile = await self.client.get_profile()
+            self._gmail_enabled = True
+            logger.info("Gmail service test successful")
         except Exception as e:
             logger.warning(f"Gmail service test failed: {e}")
-            self.gmail_service = None
-            self.gmail_enabled = False
+            self._gmail_enabled = False
+        finally:
+            self._gmail_checked = True
 
-    def send_email(self, to_email, subject, body, from_email=None):
+    async def send_email(self, to_email, subject, body, from_email=None):
         """Send email using Gmail API with proper error handling"""
-        if not self.gmail_enabled or not self.gmail_service:
+        await self.ensure_gmail_checked()
+        if not self.gmail_enabled:
             raise Exception("Gmail service not available - use SMTP fallback")
         
         try:
@@ -86,10 +156,7 @@ class GoogleIntegration:
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
             
             # Send message
-            send_message = self.gmail_service.users().messages().send(
-                userId="me",
-                body={'raw': raw_message}
-            ).execute()
+            send_message = await self.client.send_message(raw_message)
             
             logger.info(f"Email sent successfully via Gmail API to {to_email}")
             return True
@@ -102,12 +169,13 @@ class GoogleIntegration:
                 logger.warning("Gmail API disabled due to authentication/quota issues")
             raise e
 
-    def create_calendar_event(self, title: str, start_time: str, end_time: str,
+    async def create_calendar_event(self, title: str, start_time: str, end_time: str,
                             description: str = "", location: str = "",
                             attendees: List[str] = None) -> Dict[str, Any]:
         """Create a Google Calendar event"""
         try:
-            if not self.calendar_service:
+            self._ensure_initialized()
+            if not self.calendar_enabled:
                 return {"success": False, "error": "Calendar service not initialized"}
 
             # Fix datetime format - ensure proper ISO format
@@ -157,11 +225,18 @@ class GoogleIntegration:
             if attendees:
                 event['attendees'] = [{'email': email} for email in attendees]
 
-            # Use primary calendar or specify calendar ID
-            event = self.calendar_service.events().insert(
-                calendarId='primary', 
-                body=event
-            ).execute()
+            # Use primary calendar or specify calendar ID. The outbox token doubles as the
+            # event id, so a retry whose first attempt landed is answered by Google with 409
+            async def insert(token):
+                try:
+                    return await self.client.insert_event('primary', dict(event, id=token))
+                except GoogleAPIError as e:
+                    if e.status != 409:
+                        raise
+                    return await self.client.get_event('primary', token)
+
+            event = await outbox.run("calendar.insert_event", event, insert)
+            self.calendar_cache.upsert(event)
             
             return {
                 "success": True, 
@@ -170,49 +245,33 @@ class GoogleIntegration:
                 "message": f"✅ Event '{title}' created successfully"
             }
             
-        except HttpError as e:
+        except GoogleAPIError as e:
             logger.error(f"Calendar API error: {e}")
             return {"success": False, "error": f"Calendar API error: {e}"}
         except Exception as e:
             logger.error(f"Error creating calendar event: {e}")
             return {"success": False, "error": str(e)}
 
-    def get_upcoming_events(self, max_results: int = 10, days_ahead: int = 7) -> Dict[str, Any]:
-        """Get upcoming calendar events"""
+    async def get_upcoming_events(self, max_results: int = 10, days_ahead: int = 7,
+                                  start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
+        """Get upcoming calendar events, or those in a YYYY-MM-DD date range (end inclusive) when given"""
         try:
-            if not self.calendar_service:
+            self._ensure_initialized()
+            if not self.calendar_enabled:
                 return {"success": False, "error": "Calendar service not initialized"}
 
-            # Fix datetime formatting for Google Calendar API
-            now = datetime.utcnow()
-            future_date = now + timedelta(days=days_ahead)
-            
-            # Ensure proper ISO format with timezone
-            time_min = now.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-            time_max = future_date.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-            
-            events_result = self.calendar_service.events().list(
-                calendarId='primary',
-                timeMin=time_min,
-                timeMax=time_max,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
-            
-            formatted_events = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                formatted_events.append({
-                    'id': event['id'],
-                    'title': event.get('summary', 'No Title'),
-                    'start': start,
-                    'location': event.get('location', ''),
-                    'description': event.get('description', ''),
-                    'attendees': [attendee.get('email') for attendee in event.get('attendees', [])]
-                })
+            # Bring the local event cache up to date (a cheap delta call at most),
+            # then answer the window from its time-sorted index
+            await self.calendar_cache.ensure_fresh(self.client)
+            if start_date:
+                # Whole local days, midnight to midnight
+                start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=CALENDAR_TIMEZONE)
+                end = datetime.strptime(end_date or start_date, "%Y-%m-%d").replace(tzinfo=CALENDAR_TIMEZONE)
+                time_min, time_max = start.timestamp(), (end + timedelta(days=1)).timestamp()
+            else:
+                time_min = time.time()
+                time_max = time_min + days_ahead * 86400
+            formatted_events = self.calendar_cache.window(time_min, time_max, max_results=max_results)
             
             return {
                 "success": True,
@@ -220,55 +279,76 @@ class GoogleIntegration:
                 "count": len(formatted_events)
             }
             
-        except HttpError as e:
+        except GoogleAPIError as e:
             logger.error(f"Calendar API error: {e}")
             return {"success": False, "error": f"Calendar API error: {e}"}
         except Exception as e:
             logger.error(f"Error getting upcoming events: {e}")
             return {"success": False, "error": str(e)}
 
-    def read_recent_emails(self, max_results: int = 10, query: str = "is:unread") -> Dict[str, Any]:
-        """Read recent emails from Gmail"""
+    async def read_recent_emails(self, max_results: int = 10, query: str = "is:unread",
+                                 include_body: bool = False) -> Dict[str, Any]:
+        """Read recent emails from the local Gmail index, falling back to a live search"""
         try:
-            if not self.gmail_service:
+            await self.ensure_gmail_checked()
+            if not self.gmail_enabled:
                 return {"success": False, "error": "Gmail service not initialized - Please add google-credentials.json file"}
 
+            # Answer from the local index when it can evaluate the query and has been built
+            # (one history delta call at most); otherwise, and while its first full sync runs
+            # in the background, use Gmail's search
+            indexed = None
+            if compile_query(query) is not None and await self.gmail_index.ensure_fresh(self.client):
+                indexed = self.gmail_index.search(query, max_results)
+            if indexed is not None:
+                if include_body and indexed:
+                    fetched = await self.client.get_messages([email['id'] for email in indexed], format='full')
+                    for email in indexed:
+                        if fetched.get(email['id']):
+                            body = self._extract_email_body(fetched[email['id']]['payload'])
+                            email['body'] = body[:500] + '...' if len(body) > 500 else body
+                return {"success": True, "emails": indexed, "count": len(indexed)}
+            
             # Get list of messages
-            results = self.gmail_service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results
-            ).execute()
+            results = await self.client.list_messages(query, max_results)
             
             messages = results.get('messages', [])
             
             if not messages:
                 return {"success": True, "emails": [], "count": 0, "message": "No emails found"}
             
+            # Header-only reads use format=metadata; full payloads are only pulled when asked for
+            message_ids = [msg['id'] for msg in messages]
+            if include_body:
+                fetched = await self.client.get_messages(message_ids, format='full')
+            else:
+                fetched = await self.client.get_messages(message_ids, format='metadata',
+                                                         metadata_headers=['Subject', 'From', 'Date'])
+            
             formatted_emails = []
             for msg in messages:
+                message = fetched.get(msg['id'])
+                if not message:
+                    continue
                 try:
-                    message = self.gmail_service.users().messages().get(
-                        userId='me',
-                        id=msg['id']
-                    ).execute()
-                    
                     headers = message['payload'].get('headers', [])
                     subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
                     sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
                     date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
                     
-                    # Get email body
-                    body = self._extract_email_body(message['payload'])
-                    
-                    formatted_emails.append({
+                    email = {
                         'id': msg['id'],
                         'subject': subject,
                         'sender': sender,
                         'date': date,
-                        'snippet': message.get('snippet', ''),
-                        'body': body[:500] + '...' if len(body) > 500 else body  # Truncate long bodies
-                    })
+                        'snippet': message.get('snippet', '')
+                    }
+                    
+                    if include_body:
+                        body = self._extract_email_body(message['payload'])
+                        email['body'] = body[:500] + '...' if len(body) > 500 else body  # Truncate long bodies
+                    
+                    formatted_emails.append(email)
                     
                 except Exception as e:
                     logger.error(f"Error processing email {msg['id']}: {e}")
@@ -280,11 +360,10 @@ class GoogleIntegration:
                 "count": len(formatted_emails)
             }
             
-        except HttpError as e:
-            error_details = e.error_details[0] if e.error_details else {}
-            if e.resp.status == 400 and error_details.get('reason') == 'failedPrecondition':
+        except GoogleAPIError as e:
+            if e.status == 400 and e.reason == 'failedPrecondition':
                 return {"success": False, "error": "Gmail API not enabled for this service account. Please enable Gmail API in Google Cloud Console and add service account email to Google Workspace."}
-            elif e.resp.status == 403:
+            elif e.status == 403:
                 return {"success": False, "error": "Permission denied. Service account needs domain-wide delegation for Gmail access."}
             else:
                 logger.error(f"Gmail API error: {e}")
@@ -293,11 +372,12 @@ class GoogleIntegration:
             logger.error(f"Error reading emails: {e}")
             return {"success": False, "error": f"Gmail connection error: {str(e)}"}
 
-    def send_gmail_email(self, to: str, subject: str, body: str, 
+    async def send_gmail_email(self, to: str, subject: str, body: str, 
                         cc: str = "", bcc: str = "") -> Dict[str, Any]:
         """Send email via Gmail API"""
         try:
-            if not self.gmail_service:
+            await self.ensure_gmail_checked()
+            if not self.gmail_enabled:
                 return {"success": False, "error": "Gmail service not initialized"}
 
             message = MIMEMultipart()
@@ -312,10 +392,7 @@ class GoogleIntegration:
             
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
             
-            send_message = self.gmail_service.users().messages().send(
-                userId='me',
-                body={'raw': raw_message}
-            ).execute()
+            send_message = await self.client.send_message(raw_message)
             
             return {
                 "success": True,
@@ -323,7 +400,7 @@ class GoogleIntegration:
                 "message": f"✅ Email sent to {to}"
             }
             
-        except HttpError as e:
+        except GoogleAPIError as e:
             logger.error(f"Gmail API error: {e}")
             return {"success": False, "error": f"Gmail API error: {e}"}
         except Exception as e:
@@ -346,28 +423,53 @@ class GoogleIntegration:
         
         return body
 
-    def get_calendar_free_busy(self, start_time: str, end_time: str) -> Dict[str, Any]:
-        """Check calendar availability for a time period"""
+    async def get_calendar_free_busy(self, start_time: str, end_time: str,
+                               calendar_ids: List[str] = None) -> Dict[str, Any]:
+        """Check availability across one or more calendars in a single freebusy query"""
         try:
-            if not self.calendar_service:
+            self._ensure_initialized()
+            if not self.calendar_enabled:
                 return {"success": False, "error": "Calendar service not initialized"}
 
+            calendar_ids = calendar_ids or ["primary"]
             body = {
                 "timeMin": start_time,
                 "timeMax": end_time,
-                "items": [{"id": "primary"}]
+                "items": [{"id": calendar_id} for calendar_id in calendar_ids]
             }
             
-            freebusy = self.calendar_service.freebusy().query(body=body).execute()
-            busy_times = freebusy['calendars']['primary']['busy']
+            freebusy = await self.client.freebusy(body)
+            calendars = freebusy.get('calendars', {})
+            # A calendar Google can't read (notFound, not shared) comes back with errors and no
+            # busy list; treating it as free would offer slots that may be taken
+            unreadable = {
+                calendar_id: ", ".join(error.get('reason', 'unknown') for error in calendars[calendar_id]['errors'])
+                if calendar_id in calendars else "missing from response"
+                for calendar_id in calendar_ids
+                if calendar_id not in calendars or calendars[calendar_id].get('errors')
+            }
+            if unreadable:
+                details = "; ".join(f"{calendar_id} ({reason})" for calendar_id, reason in unreadable.items())
+                logger.error(f"Free/busy unavailable for: {details}")
+                return {"success": False, "error": f"Could not read calendars: {details}",
+                        "unreadable_calendars": unreadable}
+            busy_by_calendar = {
+                calendar_id: calendars.get(calendar_id, {}).get('busy', [])
+                for calendar_id in calendar_ids
+            }
+            busy_times = sorted(
+                (busy for busy_list in busy_by_calendar.values() for busy in busy_list),
+                key=lambda busy: busy['start']
+            )
             
             return {
                 "success": True,
                 "busy_times": busy_times,
+                "busy_by_calendar": busy_by_calendar,
                 "is_free": len(busy_times) == 0
             }
             
-        except HttpError as e:
+        except GoogleAPIError as e:
             logger.error(f"Calendar API error: {e}")
             return {"success": False, "error": f"Calendar API error: {e}"}
         except Exception as e:
@@ -0,0 +1,111 @@
+import functools
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+from flask import Flask, make_response, request
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this cost more to compress than they save
+COMPRESS_MIN_SIZE = int(os.getenv("HTTP_COMPRESS_MIN_SIZE", "512"))
+COMPRESS_CACHE_SIZE = int(os.getenv("HTTP_COMPRESS_CACHE_SIZE", "64"))
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/manifest+json", "image/svg+xml")
+
+
+class CompressionCache:
+    def __init__(self, max_size: int = COMPRESS_CACHE_SIZE):
+        """Compressed bodies keyed by (ETag, encoding), so repeat polls skip recompression"""
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag: Optional[str], encoding: str, body: bytes) -> bytes:
+        key = (etag, encoding)
+        if etag:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+        compressed = brotli.compress(body, quality=5) if encoding == "br" else gzip.compress(body, compresslevel=6)
+        if etag:
+            with self._lock:
+                self._entries[key] = compressed
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return compressed
+
+
+compression_cache = CompressionCache()
+
+
+def negotiate_encoding(accept_encoding) -> Optional[str]:
+    """Pick br when the client accepts it and brotli is installed, else gzip"""
+    if brotli is not None and accept_encoding["br"]:
+        return "br"
+    if accept_encoding["gzip"]:
+        return "gzip"
+    return None
+
+
+def cache_policy(cache_control: str, last_modified: Optional[Callable[[], Optional[float]]] = None):
+    """Route decorator: set Cache-Control, add an ETag (plus Last-Modified) and answer 304s
+
+    `last_modified` returns a Unix timestamp for the data behind the response, or None.
+    The ETag is the body hash, suffixed per encoding so compressed variants never collide.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            response.headers["Cache-Control"] = cache_control
+            if request.method not in ("GET", "HEAD") or response.status_code != 200 or response.is_streamed:
+                return response
+            etag = hashlib.sha1(response.get_data()).hexdigest()[:20]
+            encoding = negotiate_encoding(request.accept_encodings) if _compressible(response) else None
+            response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+            modified = last_modified() if last_modified else None
+            if modified:
+                response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+            return response.make_conditional(request)
+
+        return wrapper
+    return decorator
+
+
+def _compressible(response) -> bool:
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and "Content-Encoding" not in response.headers
+        and response.mimetype.startswith(COMPRESSIBLE_TYPES)
+        and (response.content_length or 0) >= COMPRESS_MIN_SIZE
+    )
+
+
+def compress_response(response):
+    """after_request hook: gzip or brotli the body when the client accepts it"""
+    response.vary.add("Accept-Encoding")
+    if not _compressible(response):
+        return response
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    etag, _ = response.get_etag()
+    response.set_data(compression_cache.get_or_compress(etag, encoding, response.get_data()))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app: Flask):
+    app.after_request(compress_response)
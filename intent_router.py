@@ -0,0 +1,309 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from calendar_cache import CALENDAR_TIMEZONE
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Minimum posterior probability for answering locally instead of asking the LLM
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.85"))
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") != "0"
+
+FALLBACK = "chat"
+
+# Seed phrases per intent; the classifier is trained on these at import time
+EXAMPLES: Dict[str, List[str]] = {
+    "retrieve_notion_data_web": [
+        "show my tasks", "show my tasks for msa", "list tasks for cssa", "what tasks do I have",
+        "what's on my to do list", "show me the todo list", "list my notion tasks",
+        "show tasks in progress", "what tasks are not started", "open tasks for str8n up",
+        "show completed tasks", "my task list", "pending tasks", "give me my tasks",
+    ],
+    "get_upcoming_events_web": [
+        "what's on my calendar tomorrow", "what's on my calendar today", "show my calendar",
+        "upcoming events", "what meetings do I have this week", "my schedule for tomorrow",
+        "what's my schedule today", "list calendar events", "any meetings today",
+        "show upcoming appointments", "what's coming up this week", "events in the next 3 days",
+        "what do I have on tomorrow", "calendar for next week",
+    ],
+    "read_recent_emails_web": [
+        "check my email", "any new emails", "read my inbox", "show unread emails",
+        "do I have any unread messages", "latest emails", "what's in my inbox",
+        "check gmail", "show recent emails", "any new mail", "read my latest messages",
+        "show me the latest emails", "last 5 emails", "emails from today",
+    ],
+    "query_business_data_web": [
+        "status update on cssa", "how is msa going", "business overview", "overview of all businesses",
+        "give me a summary of str8n up", "how are my businesses doing", "cssa summary",
+        "msa numbers", "status of str8n up", "update on all businesses", "business summary",
+    ],
+    "check_ndis_compliance_web": [
+        "ndis compliance status", "how is the ndis audit going", "check ndis compliance",
+        "are we ready for the audit", "audit status", "ndis audit prep", "compliance check for cssa",
+    ],
+    FALLBACK: [
+        "write an email to the team about the launch", "create a task to call the accountant",
+        "draft a proposal for a new client", "schedule a meeting with sarah tomorrow at 3pm",
+        "send an email to john", "what should I focus on this week", "help me plan the camp",
+        "explain the ndis pricing rules", "write a newsletter for parents", "summarize this document",
+        "how do I improve client retention", "add a task for the audit", "book a meeting next friday",
+        "reply to the last email", "brainstorm marketing ideas", "why is the calendar empty",
+        "hello", "thanks", "who are you", "generate an invoice for cssa",
+    ],
+}
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+_BUSINESS = re.compile(r"\b(str8n\s*up|straight\s*up|cssa|msa)\b")
+_STATUS = re.compile(r"\b(not started|in progress|completed|done)\b")
+_DAYS = re.compile(r"\b(?:next|coming)\s+(\d{1,2})\s+days?\b")
+_PAST_DAYS = re.compile(r"\b(?:last|past)\s+(\d{1,2})\s+days?\b")
+_COUNT = re.compile(r"\b(?:last|latest|top|first)\s+(\d{1,2})\b")
+_SENDER = re.compile(r"\bfrom\s+([a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]+|[a-z][a-z'-]*)")
+_UNREAD = re.compile(r"\b(unread|new)\b")
+_WINDOW = re.compile(r"\b(?:(?:from|since|for|on)\s+)?(this weekend|this week|next week|last week|this month|next month|"
+                     r"today|tonight|tomorrow|yesterday)\b")
+_WEEKDAY = re.compile(r"\b(?:on\s+|this\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b")
+# Anything that asks to change something goes to the LLM, however confident the classifier is
+_WRITE = re.compile(r"\b(create|add|make|schedule|book|send|reply|draft|write|delete|remove|move|cancel|invoice)\b"
+                    r"|\bupdate\b(?!\s+on\b)")
+# Conjunctions and qualifying clauses ask for more than one slot-filled call can answer
+_COMPOUND = re.compile(r"\b(and|or|but|then|also|plus|about|that|which|who|whose|where|why|if|except|"
+                       r"without|regarding|unless)\b|[&,;]")
+
+BUSINESS_NAMES = {"str8nup": "STR8N UP", "straightup": "STR8N UP", "cssa": "CSSA", "msa": "MSA"}
+STATUS_NAMES = {"not started": "Not Started", "in progress": "In Progress", "completed": "Completed", "done": "Completed"}
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+# Date phrases each intent can turn into a window; the calendar cache holds nothing before today
+CALENDAR_WINDOWS = ("today", "tonight", "tomorrow", "this weekend", "this week", "next week",
+                    "this month", "next month")
+EMAIL_WINDOWS = ("today", "yesterday", "this week", "last week")
+# Words a slot has to consume; left over, they mean the prompt asked for something unfilled
+SLOT_WORDS = frozenset(("from", "today", "tonight", "tomorrow", "yesterday", "this", "next", "last", "past",
+                        "week", "weekend", "month", "day", "days") + WEEKDAYS)
+# Words that never change what is being asked for
+FILLER = frozenset(("please", "can", "could", "you", "hey", "hi", "just", "now", "me", "my", "the", "a", "an",
+                    "any", "all", "i", "show", "list", "get", "give", "what", "what's", "whats", "is", "are",
+                    "on", "in", "for", "of", "have", "do", "see", "view", "display", "pull", "up"))
+NOT_SENDERS = frozenset(("the", "my", "a", "an", "our", "your", "his", "her", "their", "this", "last") + tuple(SLOT_WORDS))
+
+
+def _date_windows(today: date) -> Dict[str, Tuple[date, date]]:
+    """Inclusive (start, end) dates for each relative date phrase"""
+    monday = today - timedelta(days=today.weekday())
+    month_end = (today.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    next_month_end = (month_end + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return {
+        "today": (today, today),
+        "tonight": (today, today),
+        "tomorrow": (today + timedelta(days=1), today + timedelta(days=1)),
+        "yesterday": (today - timedelta(days=1), today - timedelta(days=1)),
+        "this weekend": (max(today, monday + timedelta(days=5)), monday + timedelta(days=6)),
+        "this week": (today, monday + timedelta(days=6)),
+        "next week": (monday + timedelta(days=7), monday + timedelta(days=13)),
+        "last week": (monday - timedelta(days=7), monday - timedelta(days=1)),
+        "this month": (today, month_end),
+        "next month": (month_end + timedelta(days=1), next_month_end),
+    }
+
+
+def _epoch(day: date) -> int:
+    """Local midnight at the start of `day`, in epoch seconds"""
+    return int(datetime(day.year, day.month, day.day, tzinfo=CALENDAR_TIMEZONE).timestamp())
+
+
+def _features(text: str) -> List[str]:
+    tokens = _TOKEN.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class IntentRouter:
+    def __init__(self, examples: Dict[str, List[str]] = EXAMPLES, threshold: float = INTENT_THRESHOLD):
+        """Local intent classifier and slot filler for read-only chat requests
+
+        A multinomial naive Bayes model over word unigrams and bigrams, trained from
+        the seed phrases at start-up (well under a millisecond per prompt on CPU).
+        Prompts it is confident about, and whose every content word is covered by a
+        slot, are answered by calling the web function directly; everything else
+        falls back to the LLM.
+        """
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "routed": 0, "routed_ms": 0.0, "llm": 0, "llm_ms": 0.0}
+        self._by_intent: Counter = Counter()
+        self.train(examples)
+        # Words an intent's own seed phrases use count as covered for that intent
+        self._covered = {
+            intent: FILLER | {word for phrase in phrases for word in _TOKEN.findall(phrase.lower())
+                              if word not in SLOT_WORDS and not word.isdigit()}
+            for intent, phrases in examples.items()
+        }
+
+    def train(self, examples: Dict[str, List[str]]):
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        for intent, phrases in examples.items():
+            for phrase in phrases:
+                counts[intent].update(_features(phrase))
+        vocabulary = set().union(*counts.values())
+        total = sum(len(phrases) for phrases in examples.values())
+        self.intents = list(examples)
+        self._prior = {intent: math.log(len(examples[intent]) / total) for intent in self.intents}
+        self._log_prob: Dict[str, Dict[str, float]] = {}
+        self._unseen: Dict[str, float] = {}
+        for intent in self.intents:
+            denominator = sum(counts[intent].values()) + len(vocabulary)
+            self._log_prob[intent] = {
+                feature: math.log((count + 1) / denominator) for feature, count in counts[intent].items()
+            }
+            self._unseen[intent] = math.log(1 / denominator)
+        self._vocabulary = vocabulary
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        """Most likely intent and its posterior probability"""
+        features = [f for f in _features(text) if f in self._vocabulary]
+        if not features:
+            return FALLBACK, 1.0
+        scores = {
+            intent: self._prior[intent] + sum(self._log_prob[intent].get(f, self._unseen[intent]) for f in features)
+            for intent in self.intents
+        }
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        return best, 1 / sum(math.exp(score - top) for score in scores.values())
+
+    @staticmethod
+    def _take(pattern: "re.Pattern", text: str) -> Tuple[Optional["re.Match"], str]:
+        """First match of `pattern` and the text with that match blanked out"""
+        match = pattern.search(text)
+        if not match:
+            return None, text
+        return match, text[:match.start()] + " " + text[match.end():]
+
+    def slots(self, intent: str, text: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Fill the target function's arguments from the prompt
+
+        None if any content word is left that no slot consumed, i.e. the prompt asks
+        for something the call would silently drop.
+        """
+        text = text.lower()
+        if _COMPOUND.search(text):
+            return None
+        today = (now or datetime.now(CALENDAR_TIMEZONE)).date()
+        windows = _date_windows(today)
+        args: Dict[str, Any] = {}
+        if intent in ("retrieve_notion_data_web", "query_business_data_web"):
+            business, text = self._take(_BUSINESS, text)
+            if business:
+                args["business"] = BUSINESS_NAMES[re.sub(r"\s+", "", business.group(1))]
+        if intent == "retrieve_notion_data_web":
+            status, text = self._take(_STATUS, text)
+            if status:
+                args["status"] = STATUS_NAMES[status.group(1)]
+            count, text = self._take(_COUNT, text)
+            if count:
+                args["limit"] = max(1, int(count.group(1)))
+        elif intent == "get_upcoming_events_web":
+            days, text = self._take(_DAYS, text)
+            window, text = (None, text) if days else self._take(_WINDOW, text)
+            weekday, text = (None, text) if days or window else self._take(_WEEKDAY, text)
+            if days:
+                args["days_ahead"] = max(1, int(days.group(1)))
+            elif window and window.group(1) in CALENDAR_WINDOWS:
+                start, end = windows[window.group(1)]
+                args["start_date"], args["end_date"] = start.isoformat(), end.isoformat()
+            elif window:
+                return None
+            elif weekday:
+                day = today + timedelta(days=(WEEKDAYS.index(weekday.group(1)) - today.weekday()) % 7)
+                args["start_date"] = args["end_date"] = day.isoformat()
+            else:
+                args["days_ahead"] = 7
+        elif intent == "read_recent_emails_web":
+            terms: List[str] = []
+            if _UNREAD.search(text):
+                terms.append("is:unread")
+            days, text = self._take(_PAST_DAYS, text)
+            window, text = (None, text) if days else self._take(_WINDOW, text)
+            if days:
+                terms.append(f"newer_than:{max(1, int(days.group(1)))}d")
+            elif window and window.group(1) in EMAIL_WINDOWS:
+                start, end = windows[window.group(1)]
+                if window.group(1) == "this week":
+                    # Mail so far this week, not the days left in it
+                    start = today - timedelta(days=today.weekday())
+                terms.append(f"after:{_epoch(start)}")
+                if end < today:
+                    terms.append(f"before:{_epoch(end + timedelta(days=1))}")
+            elif window:
+                return None
+            count, text = self._take(_COUNT, text)
+            if count:
+                args["max_results"] = max(1, int(count.group(1)))
+            sender = _SENDER.search(text)
+            if sender and sender.group(1) not in NOT_SENDERS:
+                terms.append(f"from:{sender.group(1)}")
+                text = text[:sender.start()] + " " + text[sender.end():]
+            # With no terms, the function's own is:unread default stands
+            if terms:
+                args["query"] = " ".join(terms)
+        if intent == FALLBACK or any(not self._is_covered(intent, word) for word in _TOKEN.findall(text)):
+            return None
+        return args
+
+    def _is_covered(self, intent: str, word: str) -> bool:
+        covered = self._covered.get(intent, FILLER)
+        # Singular and plural forms of a seed word both count
+        return word in covered or word.rstrip("s") in covered or f"{word}s" in covered
+
+    def route(self, text: str) -> Optional[Dict[str, Any]]:
+        """{name, arguments, confidence} for a confident read-only match, else None"""
+        if not INTENT_ROUTER_ENABLED or len(text) > 200 or _WRITE.search(text.lower()):
+            return None
+        intent, confidence = self.classify(text)
+        if intent == FALLBACK or confidence < self.threshold:
+            return None
+        arguments = self.slots(intent, text)
+        if arguments is None:
+            return None
+        return {"name": intent, "arguments": arguments, "confidence": round(confidence, 3)}
+
+    def record(self, name: Optional[str], elapsed_ms: float):
+        """Count one chat request answered locally (name set) or by the LLM (None)"""
+        with self._lock:
+            self._stats["requests"] += 1
+            if name:
+                self._stats["routed"] += 1
+                self._stats["routed_ms"] += elapsed_ms
+                self._by_intent[name] += 1
+            else:
+                self._stats["llm"] += 1
+                self._stats["llm_ms"] += elapsed_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            by_intent = dict(self._by_intent)
+        avg_routed = s["routed_ms"] / s["routed"] if s["routed"] else 0.0
+        avg_llm = s["llm_ms"] / s["llm"] if s["llm"] else 0.0
+        return {
+            "requests": s["requests"],
+            "routed": s["routed"],
+            "hit_rate": round(s["routed"] / s["requests"], 3) if s["requests"] else 0.0,
+            "avg_routed_ms": round(avg_routed, 1),
+            "avg_llm_ms": round(avg_llm, 1),
+            # Only meaningful once both paths have been seen
+            "estimated_saved_ms": round(max(avg_llm - avg_routed, 0) * s["routed"], 1) if s["llm"] else None,
+            "by_intent": by_intent,
+        }
+
+# Initialize global instance
+intent_router = IntentRouter()
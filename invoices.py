@@ -0,0 +1,196 @@
+import asyncio
+import html
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+INVOICE_DB_PATH = os.getenv("INVOICE_DB_PATH", os.path.join(tempfile.gettempdir(), "super_agent_invoices.db"))
+INVOICE_OUTPUT_DIR = os.getenv("INVOICE_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "super_agent_invoices"))
+INVOICE_DUE_DAYS = 14
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoice_sequences (
+    prefix TEXT PRIMARY KEY,
+    last_value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invoices (
+    number TEXT PRIMARY KEY,
+    client_name TEXT NOT NULL,
+    business TEXT NOT NULL,
+    service TEXT,
+    amount REAL NOT NULL,
+    hours REAL,
+    rate REAL,
+    date TEXT NOT NULL,
+    due_date TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_client ON invoices (client_name, date);
+"""
+
+BUSINESS_NAMES = {
+    "STR8N UP": "STR8N UP Growth Hub",
+    "CSSA": "Care Support Services Australia",
+    "MSA": "Miraj Scouts Academy",
+}
+
+
+def render_invoice(invoice: Dict[str, Any]) -> str:
+    """Render one invoice as a standalone HTML document"""
+    rows = "".join(
+        f"<tr><td>{html.escape(line['date'] or '')}</td><td>{html.escape(line['service'])}</td>"
+        f"<td>{line['hours']:g}</td><td>${line['rate']:.2f}</td><td>${line['amount']:.2f}</td></tr>"
+        for line in invoice["lines"]
+    )
+    business = html.escape(BUSINESS_NAMES.get(invoice["business"], invoice["business"]))
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Invoice {invoice['number']}</title></head><body>"
+        f"<h1>{business}</h1><h2>Tax Invoice {invoice['number']}</h2>"
+        f"<p>Bill to: {html.escape(invoice['client_name'])}<br>Date: {invoice['date']}<br>Due: {invoice['due_date']}</p>"
+        f"<table><tr><th>Date</th><th>Service</th><th>Hours</th><th>Rate</th><th>Amount</th></tr>{rows}</table>"
+        f"<p><strong>Total: ${invoice['amount']:.2f}</strong></p></body></html>"
+    )
+
+
+def _render_to_files(invoices: List[Dict[str, Any]], output_dir: str) -> List[str]:
+    """Render invoices and write them out, one HTML file each"""
+    paths = []
+    for invoice in invoices:
+        path = os.path.join(output_dir, f"{invoice['number']}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_invoice(invoice))
+        paths.append(path)
+    return paths
+
+
+class InvoiceEngine:
+    def __init__(self, path: str = INVOICE_DB_PATH, output_dir: str = INVOICE_OUTPUT_DIR):
+        """Invoice numbering and generation backed by a SQLite sequence table
+
+        Numbers are allocated inside an IMMEDIATE transaction, so they stay unique
+        across threads and across worker processes sharing the same file.
+        """
+        self.path = path
+        self.output_dir = output_dir
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite's file lock serializes allocations
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.executescript(SCHEMA)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def prefix(business: str, date: str) -> str:
+        """Per-business, per-day number prefix, e.g. CSS20250526"""
+        return f"{business[:3].upper()}{date.replace('-', '')}"
+
+    def _allocate(self, conn: sqlite3.Connection, prefix: str, count: int) -> List[str]:
+        conn.execute("INSERT OR IGNORE INTO invoice_sequences (prefix, last_value) VALUES (?, 0)", (prefix,))
+        last = conn.execute(
+            "UPDATE invoice_sequences SET last_value = last_value + ? WHERE prefix = ? RETURNING last_value",
+            (count, prefix)
+        ).fetchone()[0]
+        return [f"{prefix}{value:03d}" for value in range(last - count + 1, last + 1)]
+
+    def _save(self, invoices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Number and store invoices in one transaction"""
+        conn = self._db()
+        now = time.time()
+        by_prefix: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for invoice in invoices:
+            by_prefix.setdefault(self.prefix(invoice["business"], invoice["date"]), []).append(invoice)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for prefix, group in by_prefix.items():
+                for invoice, number in zip(group, self._allocate(conn, prefix, len(group))):
+                    invoice["number"] = number
+            conn.executemany(
+                "INSERT INTO invoices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(i["number"], i["client_name"], i["business"], i["service"], i["amount"],
+                  i["hours"], i["rate"], i["date"], i["due_date"], now) for i in invoices]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return invoices
+
+    @staticmethod
+    def _draft(client_name: str, business: str, lines: List[Dict[str, Any]],
+               date: Optional[str] = None) -> Dict[str, Any]:
+        issued = datetime.strptime(date, "%Y-%m-%d") if date else datetime.now()
+        amount = round(sum(line["amount"] for line in lines), 2)
+        hours = round(sum(line["hours"] for line in lines), 2)
+        services = list(OrderedDict.fromkeys(line["service"] for line in lines))
+        return {
+            "number": None,
+            "client_name": client_name,
+            "business": business,
+            "service": ", ".join(services),
+            "amount": amount,
+            "hours": hours,
+            "rate": lines[0]["rate"] if len({line["rate"] for line in lines}) == 1 else 0,
+            "date": issued.strftime("%Y-%m-%d"),
+            "due_date": (issued + timedelta(days=INVOICE_DUE_DAYS)).strftime("%Y-%m-%d"),
+            "lines": lines,
+        }
+
+    def create(self, client_name: str, business: str, service: str, amount: float,
+               hours: float = 0, rate: float = 0) -> Dict[str, Any]:
+        """Number and record a single invoice"""
+        line = {"date": datetime.now().strftime("%Y-%m-%d"), "service": service,
+                "hours": hours, "rate": rate, "amount": round(amount, 2)}
+        return self._save([self._draft(client_name, business, [line])])[0]
+
+    async def create_batch(self, records: List[Dict[str, Any]], business: str = "CSSA",
+                           default_rate: float = 0, date: Optional[str] = None) -> Dict[str, Any]:
+        """Turn a period's hours records into one invoice per client, numbered and rendered in one pass
+
+        Each record has client_name, hours and optionally rate, service and date.
+        """
+        lines_by_client: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for record in records:
+            hours = float(record.get("hours", 0))
+            rate = float(record.get("rate") or default_rate)
+            lines_by_client.setdefault(record["client_name"].strip(), []).append({
+                "date": record.get("date", ""),
+                "service": record.get("service", "Support services"),
+                "hours": hours,
+                "rate": rate,
+                "amount": round(hours * rate, 2),
+            })
+        drafts = [self._draft(client, business, lines, date) for client, lines in lines_by_client.items()]
+        invoices = await asyncio.to_thread(self._save, drafts)
+        paths = await self.render(invoices)
+        return {"invoices": invoices, "paths": paths,
+                "total": round(sum(invoice["amount"] for invoice in invoices), 2)}
+
+    async def render(self, invoices: List[Dict[str, Any]]) -> List[str]:
+        """Write invoices to INVOICE_OUTPUT_DIR as HTML, off the event loop
+
+        Rendering is a few microseconds of string formatting per invoice, so one
+        worker thread keeps up with any realistic batch.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        return await asyncio.to_thread(_render_to_files, invoices, self.output_dir)
+
+# Initialize global instance
+invoice_engine = InvoiceEngine()
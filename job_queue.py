@@ -0,0 +1,235 @@
+import asyncio
+import inspect
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+import web_functions
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+JOBS_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(tempfile.gettempdir(), "super_agent_jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "2"))
+# A running job whose worker has not finished within the lease is picked up again if it has attempts left
+JOB_LEASE = float(os.getenv("JOB_LEASE", "300"))
+JOB_POLL_INTERVAL = 1.0
+
+# Side-effecting web functions that may run in the background
+WRITE_ACTIONS = (
+    "send_email_web",
+    "send_gmail_web",
+    "send_bulk_email_web",
+    "create_notion_task_web",
+    "create_notion_tasks_web",
+    "update_notion_tasks_web",
+    "create_google_calendar_event_web",
+    "generate_invoices_batch_web",
+)
+
+# Actions that must never run twice: no retries, and a lapsed lease fails the job instead of
+# re-running it, since the first attempt may already have sent mail or numbered invoices
+ONCE_ONLY_ACTIONS = frozenset({"send_email_web", "send_gmail_web", "send_bulk_email_web",
+                               "generate_invoices_batch_web"})
+
+# ❌ results worth retrying: rate limits, upstream 5xx, timeouts and network errors
+TRANSIENT_FAILURE = re.compile(
+    r"\b(429|5\d\d)\b|rate.?limit|timed? ?out|timeout|network error|temporar|unavailable", re.IGNORECASE
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    action TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_after);
+"""
+
+JOB_FIELDS = ("id", "action", "args", "status", "attempts", "max_attempts", "run_after",
+              "lease_until", "result", "error", "created", "updated")
+
+
+class JobQueue:
+    def __init__(self, actions: Dict[str, Callable[..., Awaitable[Any]]], path: str = JOBS_PATH,
+                 workers: int = JOB_WORKERS, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 retry_base: float = JOB_RETRY_BASE):
+        """Durable SQLite-backed queue for slow side effects, drained by a pool of async workers
+
+        Jobs survive restarts, and claims are atomic, so several processes can share one file.
+        """
+        self.actions = actions
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.executescript(SCHEMA)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        job = dict(zip(JOB_FIELDS, row))
+        job["args"] = json.loads(job["args"])
+        return job
+
+    def enqueue(self, action: str, args: Optional[Dict[str, Any]] = None,
+                max_attempts: Optional[int] = None) -> str:
+        """Record a job and return its id; raises ValueError for unknown actions"""
+        if action not in self.actions:
+            raise ValueError(f"Unknown action: {action}")
+        try:
+            inspect.signature(self.actions[action]).bind(**(args or {}))
+        except TypeError as e:
+            raise ValueError(f"Invalid arguments for {action}: {e}")
+        if action in ONCE_ONLY_ACTIONS:
+            max_attempts = 1
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO jobs (id, action, args, status, max_attempts, run_after, created, updated) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, action, json.dumps(args or {}), max_attempts or self.max_attempts, now, now, now)
+            )
+            db.commit()
+        self._notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest ready job (or one whose lease lapsed with attempts left)"""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            # A lapsed lease counts as an attempt of unknown outcome; out of attempts means failed
+            db.execute(
+                "UPDATE jobs SET status = 'failed', lease_until = NULL, "
+                "error = 'Worker lost during the last attempt; outcome unknown', updated = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            row = db.execute(
+                f"UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated = ? "
+                f"WHERE id = (SELECT id FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                f"OR (status = 'running' AND lease_until < ?) ORDER BY run_after LIMIT 1) "
+                f"RETURNING {', '.join(JOB_FIELDS)}",
+                (now + JOB_LEASE, now, now, now)
+            ).fetchone()
+            db.commit()
+        return self._row(row) if row else None
+
+    def _finish(self, job: Dict[str, Any], result: Optional[str], error: Optional[str],
+                retryable: bool = True):
+        now = time.time()
+        if error is None:
+            status, run_after = "succeeded", job["run_after"]
+        elif retryable and job["attempts"] < job["max_attempts"]:
+            # Exponential backoff with jitter: 2s, 4s, 8s, ...
+            delay = self.retry_base * 2 ** (job["attempts"] - 1)
+            status, run_after = "queued", now + delay * random.uniform(0.8, 1.2)
+            logger.warning(f"Job {job['id']} ({job['action']}) attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+        else:
+            status, run_after = "failed", job["run_after"]
+            logger.error(f"Job {job['id']} ({job['action']}) failed after {job['attempts']} attempt(s): {error}")
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, lease_until = NULL, result = ?, error = ?, updated = ? "
+                "WHERE id = ?",
+                (status, run_after, result, error, now, job["id"])
+            )
+            db.commit()
+
+    async def _run(self, job: Dict[str, Any]):
+        try:
+            result = await self.actions[job["action"]](**job["args"])
+        except Exception as e:
+            # Exceptions and timeouts are retried, except upstream 4xx rejections other than 429
+            status = getattr(e, "status", None)
+            rejected = isinstance(status, int) and 400 <= status < 500 and status != 429
+            self._finish(job, None, str(e), retryable=not rejected)
+            return
+        # web_functions report failures as ❌ strings rather than raising; only transient
+        # ones are retried, permanent ones (not configured, auth, validation) fail at once
+        if isinstance(result, str) and result.startswith("❌"):
+            self._finish(job, result, result, retryable=bool(TRANSIENT_FAILURE.search(result)))
+        else:
+            self._finish(job, str(result), None)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"Job queue claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    def _notify(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start the worker pool on `loop`, which must be running on another thread"""
+        if self._loop is not None:
+            return
+
+        async def spawn():
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        self._loop = loop
+        asyncio.run_coroutine_threadsafe(spawn(), loop).result()
+        logger.info(f"Job queue started with {self.workers} workers ({self.path})")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+# Initialize global instance
+job_queue = JobQueue({name: getattr(web_functions, name) for name in WRITE_ACTIONS})
@@ -0,0 +1,155 @@
+import asyncio
+import bisect
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from aiohttp import web
+from dotenv import load_dotenv
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(tempfile.gettempdir(), "ops_latency.json"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))
+
+# Bucket upper bounds in seconds, tuned for voice turns (tens of ms to several seconds)
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Fixed-bucket latency histogram; constant memory on the hot path"""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+
+class LatencyRecorder:
+    def __init__(self):
+        """Per-stage histograms for voice turns (eou, stt, llm_ttft, tts_ttfb, tool.<name>)"""
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    def observe(self, stage: str, seconds: Optional[float]):
+        if seconds is None or seconds < 0:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def timed(self, stage: Optional[str] = None):
+        """Decorator recording an async function's wall time under `stage`"""
+        def decorator(func):
+            name = stage or f"tool.{func.__name__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started)
+
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """count, mean, p50 and p95 per stage, in milliseconds"""
+        with self._lock:
+            result = {}
+            for stage, histogram in sorted(self.histograms.items()):
+                result[stage] = {
+                    "count": histogram.count,
+                    "mean_ms": round(histogram.total / histogram.count * 1000, 1),
+                    "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 1),
+                }
+            return result
+
+    def prometheus_text(self) -> str:
+        """Render histograms in the Prometheus text exposition format"""
+        lines = ["# TYPE ops_stage_latency_seconds histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'ops_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'ops_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'ops_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'ops_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str = METRICS_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"timestamp": time.time(), "stages": self.snapshot()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_exporters(self, path: str = METRICS_PATH, interval: float = METRICS_DUMP_INTERVAL,
+                        port: int = METRICS_PORT):
+        """Periodically dump to `path`, and serve /metrics on `port` when it is set"""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+
+        async def dump_loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    logger.warning(f"Failed to write latency metrics: {e}")
+
+        self._tasks.append(loop.create_task(dump_loop()))
+
+        if port:
+            async def metrics_handler(request):
+                return web.Response(text=self.prometheus_text(), content_type="text/plain")
+
+            async def serve():
+                app = web.Application()
+                app.router.add_get("/metrics", metrics_handler)
+                runner = web.AppRunner(app)
+                await runner.setup()
+                await web.TCPSite(runner, "0.0.0.0", port).start()
+                logger.info(f"Latency metrics served on :{port}/metrics")
+
+            self._tasks.append(loop.create_task(serve()))
+
+# Initialize global instance
+latency = LatencyRecorder()
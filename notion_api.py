@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import aiohttp
+from dotenv import load_dotenv
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
+NOTION_VERSION = "2022-06-28"
+# Notion allows an average of three requests per second per integration
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_MAX_RETRIES = 3
+
+
+class NotionAPIError(Exception):
+    """Raised when Notion answers with a non-2xx status"""
+
+    def __init__(self, status: int, message: str, body: Optional[Dict[str, Any]] = None):
+        super().__init__(f"Notion API error {status}: {message}")
+        self.status = status
+        self.message = message
+        self.body = body or {}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Token bucket pacing awaiting callers to `rate` requests per second"""
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, cost: float) -> float:
+        """Take tokens (possibly going into debt) and return how long to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= cost
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        while True:
+            delay = self._reserve(1)
+            if delay:
+                await asyncio.sleep(delay)
+            with self._lock:
+                wait = self.blocked_until - time.monotonic()
+                if wait <= 0:
+                    return
+                # A 429 paused the bucket after this slot was reserved; give it back and queue again
+                self.tokens = min(self.burst, self.tokens + 1)
+            await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Hold every caller back for `seconds`, e.g. after a 429 Retry-After"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class NotionClient:
+    def __init__(self, token: Optional[str] = None, pool_size: int = 10,
+                 timeout: float = 15.0, keepalive: float = 60.0,
+                 rate_limit: float = NOTION_RATE_LIMIT):
+        """Async Notion client sharing one keep-alive connection pool per event loop"""
+        self.token = token or os.getenv("NOTION_TOKEN")
+        self.bucket = TokenBucket(rate_limit)
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=5.0)
+        self.keepalive = keepalive
+        self.headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION
+        }
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.token)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the running loop's pooled session, creating it on first use
+
+        A session is bound to the loop it was created on: api.py's shared loop keeps
+        one for the process, while the voice agent and scripts bring their own.
+        """
+        loop = asyncio.get_running_loop()
+        # Sessions of loops that have since closed can't be awaited any more; just let them go
+        for stale in [other for other in self._sessions if other.is_closed()]:
+            del self._sessions[stale]
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    keepalive_timeout=self.keepalive,
+                    ttl_dns_cache=300
+                )
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def request(self, method: str, path: str,
+                      json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Send a rate-limited request to Notion and return the decoded JSON body"""
+        session = await self._get_session()
+        for attempt in range(NOTION_MAX_RETRIES + 1):
+            await self.bucket.acquire()
+            async with session.request(method, f"{NOTION_API_URL}/{path}", json=json) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = {"message": await response.text()}
+                if response.status == 429 and attempt < NOTION_MAX_RETRIES:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                    logger.warning(f"Notion rate limited, retrying in {retry_after}s")
+                    self.bucket.penalize(retry_after)
+                    continue
+                if response.status >= 300:
+                    message = data.get("message", "Unknown error") if isinstance(data, dict) else str(data)
+                    raise NotionAPIError(response.status, message, data if isinstance(data, dict) else None)
+                return data
+
+    async def query_database(self, database_id: str, filter: Optional[Dict[str, Any]] = None,
+                             sorts: Optional[list] = None, page_size: Optional[int] = None,
+                             start_cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Query one page of results from a Notion database"""
+        body: Dict[str, Any] = {}
+        if filter:
+            body["filter"] = filter
+        if sorts:
+            body["sorts"] = sorts
+        if page_size:
+            body["page_size"] = page_size
+        if start_cursor:
+            body["start_cursor"] = start_cursor
+        return await self.request("POST", f"databases/{database_id}/query", json=body)
+
+    async def iter_database(self, database_id: str, filter: Optional[Dict[str, Any]] = None,
+                            sorts: Optional[list] = None,
+                            page_size: int = 100) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield a database's results one API page at a time, following next_cursor
+
+        Stop iterating early to skip the remaining requests.
+        """
+        cursor = None
+        while True:
+            data = await self.query_database(database_id, filter=filter, sorts=sorts,
+                                             page_size=page_size, start_cursor=cursor)
+            yield data.get("results", [])
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            cursor = data["next_cursor"]
+
+    async def create_page(self, database_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a page in a Notion database"""
+        return await self.request("POST", "pages", json={
+            "parent": {"database_id": database_id},
+            "properties": properties
+        })
+
+    async def update_page(self, page_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+        """Update properties on an existing Notion page"""
+        return await self.request("PATCH", f"pages/{page_id}", json={"properties": properties})
+
+    async def _outcome(self, call) -> Dict[str, Any]:
+        try:
+            return {"success": True, "page": await call}
+        except NotionAPIError as e:
+            return {"success": False, "status": e.status, "error": e.message}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    async def update_pages(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Update many (page_id, properties) pairs; one outcome per item, in order"""
+        return await asyncio.gather(*(
+            self._outcome(self.update_page(page_id, properties)) for page_id, properties in items
+        ))
+
+    async def close(self):
+        """Close the running loop's session; sessions of other loops are left alone"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+# Initialize global instance
+notion = NotionClient()
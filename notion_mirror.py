@@ -0,0 +1,377 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from notion_api import notion, NotionClient
+from write_outbox import outbox
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+MIRROR_PATH = os.getenv("NOTION_MIRROR_PATH", os.path.join(tempfile.gettempdir(), "super_agent_notion.db"))
+MAX_STALENESS = float(os.getenv("NOTION_MIRROR_MAX_STALENESS", "60"))
+FULL_SYNC_INTERVAL = float(os.getenv("NOTION_MIRROR_FULL_SYNC_INTERVAL", "21600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id TEXT PRIMARY KEY,
+    database_id TEXT NOT NULL,
+    title TEXT,
+    business TEXT,
+    status TEXT,
+    priority TEXT,
+    due_date TEXT,
+    created_time TEXT,
+    last_edited_time TEXT,
+    seen_sync INTEGER,
+    page TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_business ON pages (database_id, business);
+CREATE INDEX IF NOT EXISTS idx_pages_status ON pages (database_id, status);
+CREATE INDEX IF NOT EXISTS idx_pages_priority ON pages (database_id, priority);
+CREATE INDEX IF NOT EXISTS idx_pages_due_date ON pages (database_id, due_date);
+CREATE INDEX IF NOT EXISTS idx_pages_created ON pages (database_id, created_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    watermark TEXT,
+    last_sync REAL,
+    last_full_sync REAL,
+    sync_generation INTEGER
+);
+"""
+
+# Status names that mean a task needs no more work
+DONE_STATUSES = ("Done", "Complete", "Completed")
+
+ORDERINGS = {
+    "created": "created_time DESC",
+    "priority": "priority DESC",
+    "due_date": "due_date IS NULL, due_date ASC",
+}
+
+
+def _select_name(props: Dict[str, Any], name: str) -> Optional[str]:
+    value = (props.get(name) or {}).get("select")
+    return value.get("name") if value else None
+
+
+def _same_date(a: Optional[str], b: Optional[str]) -> bool:
+    """Whether two Notion date values name the same date or instant, whatever their format
+
+    Notion echoes datetimes back in its own form (e.g. 09:00 -> 09:00:00.000+10:00);
+    when only one side carries an offset, the wall-clock times are compared.
+    """
+    if not a or not b:
+        return not a and not b
+    try:
+        left, right = datetime.fromisoformat(a), datetime.fromisoformat(b)
+    except ValueError:
+        return a == b
+    if (left.tzinfo is None) != (right.tzinfo is None):
+        left, right = left.replace(tzinfo=None), right.replace(tzinfo=None)
+    return left == right
+
+
+def _page_row(database_id: str, page: Dict[str, Any], generation: int) -> tuple:
+    """Flatten the indexed columns out of a raw Notion page"""
+    props = page.get("properties", {})
+    title = ""
+    for prop in props.values():
+        if prop.get("title"):
+            title = "".join(part.get("plain_text", part.get("text", {}).get("content", "")) for part in prop["title"])
+            break
+    due = (props.get("Due Date") or {}).get("date")
+    return (
+        page["id"],
+        database_id,
+        title,
+        _select_name(props, "Business"),
+        _select_name(props, "Status"),
+        _select_name(props, "Priority"),
+        due.get("start") if due else None,
+        page.get("created_time"),
+        page.get("last_edited_time"),
+        generation,
+        json.dumps(page, separators=(",", ":")),
+    )
+
+
+class NotionMirror:
+    def __init__(self, database_id: Optional[str], path: str = MIRROR_PATH,
+                 client: NotionClient = notion, max_staleness: float = MAX_STALENESS,
+                 full_sync_interval: float = FULL_SYNC_INTERVAL):
+        """Local SQLite mirror of a Notion database, kept fresh by incremental syncs"""
+        self.database_id = database_id
+        self.path = path
+        self.client = client
+        self.max_staleness = max_staleness
+        self.full_sync_interval = full_sync_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inflight: Optional[asyncio.Future] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.database_id and self.client.configured)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def _state(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT watermark, last_sync, last_full_sync, sync_generation FROM sync_state WHERE database_id = ?",
+                (self.database_id,)
+            ).fetchone()
+        if not row:
+            return {"watermark": None, "last_sync": 0.0, "last_full_sync": 0.0, "sync_generation": 0}
+        return {"watermark": row[0], "last_sync": row[1] or 0.0,
+                "last_full_sync": row[2] or 0.0, "sync_generation": row[3] or 0}
+
+    def staleness(self) -> float:
+        """Seconds since the last successful sync"""
+        return time.time() - self._state()["last_sync"]
+
+    def upsert_page(self, page: Dict[str, Any], generation: Optional[int] = None):
+        """Write a page into the mirror, e.g. straight after creating it upstream"""
+        if generation is None:
+            generation = self._state()["sync_generation"]
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                       _page_row(self.database_id, page, generation))
+            db.commit()
+
+    async def create_page(self, properties: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a page upstream at most once per outbox window, then mirror it"""
+        page = await outbox.run(
+            "notion.create_page", {"database_id": self.database_id, "properties": properties},
+            lambda token: self.client.create_page(self.database_id, properties),
+            reconcile=lambda token, started: self._find_created(properties, started)
+        )
+        self.upsert_page(page)
+        return page
+
+    async def create_pages(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many pages through create_page; one {success, page|status, error} per item, in order"""
+        results = await asyncio.gather(*(self.create_page(properties) for properties in items),
+                                       return_exceptions=True)
+        return [
+            {"success": False, "status": getattr(result, "status", None),
+             "error": getattr(result, "message", str(result))}
+            if isinstance(result, Exception) else {"success": True, "page": result}
+            for result in results
+        ]
+
+    async def update_pages(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """Update many (page_id, properties) pairs upstream and mirror the pages that changed"""
+        outcomes = await self.client.update_pages(items)
+        for outcome in outcomes:
+            if outcome["success"]:
+                self.upsert_page(outcome["page"])
+        return outcomes
+
+    def find_by_title(self, titles: List[str]) -> Dict[str, str]:
+        """Case-insensitive title -> page id for the newest page with each title"""
+        if not titles:
+            return {}
+        marks = ",".join("?" * len(titles))
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT title, id FROM pages WHERE database_id = ? AND title COLLATE NOCASE IN ({marks}) "
+                f"ORDER BY created_time",
+                [self.database_id] + list(titles)
+            ).fetchall()
+        return {title.casefold(): page_id for title, page_id in rows}
+
+    async def _find_created(self, properties: Dict[str, Any], since: float) -> Optional[Dict[str, Any]]:
+        """The page an earlier attempt created upstream since `since`, if it landed
+
+        Asks Notion directly rather than the mirror, which may not have synced it yet,
+        and only accepts a page whose title, business, status, priority and due date
+        all match the write, so an unrelated task with the same title isn't claimed.
+        """
+        wanted = _page_row(self.database_id, {"id": "", "properties": properties}, 0)
+        title_prop = next((name for name, prop in properties.items() if "title" in prop), None)
+        # Notion rounds created_time down to the minute
+        cutoff = datetime.fromtimestamp(since - since % 60, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        conditions = [{"timestamp": "created_time", "created_time": {"on_or_after": cutoff}}]
+        if title_prop:
+            conditions.append({"property": title_prop, "title": {"equals": wanted[2]}})
+        sorts = [{"timestamp": "created_time", "direction": "ascending"}]
+        async for results in self.client.iter_database(self.database_id, filter={"and": conditions}, sorts=sorts):
+            for page in results:
+                found = _page_row(self.database_id, page, 0)
+                if found[2:6] == wanted[2:6] and _same_date(found[6], wanted[6]):
+                    return page
+        return None
+
+    async def sync(self, full: bool = False) -> int:
+        """Pull pages edited since the last watermark; returns the number of pages written
+
+        Concurrent callers share the sync already in flight instead of reading a
+        half-filled mirror; a full sync requested meanwhile runs after it.
+        """
+        if not self.enabled:
+            return 0
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            written = await asyncio.shield(inflight)
+            if not full:
+                return written
+            inflight = self._inflight
+            if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+                return await asyncio.shield(inflight)
+        task = loop.create_task(self._sync(full))
+        self._inflight = task
+        return await asyncio.shield(task)
+
+    async def _sync(self, full: bool) -> int:
+        state = self._state()
+        now = time.time()
+        full = full or not state["watermark"] or now - state["last_full_sync"] > self.full_sync_interval
+        generation = state["sync_generation"] + 1 if full else state["sync_generation"]
+        # Notion rounds last_edited_time down to the minute, so the watermark is the start
+        # of the minute the sync began in; the next pass re-reads that boundary minute
+        sync_started = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+        query_filter = None
+        if not full:
+            query_filter = {"timestamp": "last_edited_time",
+                            "last_edited_time": {"on_or_after": state["watermark"]}}
+
+        # Stream page by page so large databases never sit in memory at once
+        written = 0
+        async for results in self.client.iter_database(self.database_id, filter=query_filter):
+            rows = [_page_row(self.database_id, page, generation) for page in results]
+            with self._lock:
+                db = self._db()
+                db.executemany("INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+                db.commit()
+            written += len(rows)
+
+        with self._lock:
+            db = self._db()
+            if full:
+                # Anything a full pass did not see was archived or deleted upstream
+                db.execute("DELETE FROM pages WHERE database_id = ? AND seen_sync < ?",
+                           (self.database_id, generation))
+            db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?,?,?,?,?)",
+                (self.database_id, sync_started, now,
+                 now if full else state["last_full_sync"], generation)
+            )
+            db.commit()
+        logger.info(f"Notion mirror {'full' if full else 'incremental'} sync: {written} pages")
+        return written
+
+    async def ensure_fresh(self, max_staleness: Optional[float] = None):
+        """Sync only if the mirror is older than the staleness window"""
+        window = self.max_staleness if max_staleness is None else max_staleness
+        if self.enabled and self.staleness() > window:
+            try:
+                await self.sync()
+            except Exception as e:
+                # Serve the last good copy rather than failing the read
+                if not self._state()["last_sync"]:
+                    raise
+                logger.warning(f"Notion mirror sync failed, serving stale data: {e}")
+
+    def _where(self, business: Optional[str], status: Optional[str],
+               priority: Optional[str]) -> tuple:
+        clauses = ["database_id = ?"]
+        params: List[Any] = [self.database_id]
+        for column, value in (("business", business), ("status", status), ("priority", priority)):
+            if value and value != "ALL":
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return " AND ".join(clauses), params
+
+    def query(self, business: Optional[str] = None, status: Optional[str] = None,
+              priority: Optional[str] = None, limit: Optional[int] = None,
+              order_by: str = "created") -> List[Dict[str, Any]]:
+        """Return raw Notion pages matching the filters from the local mirror"""
+        where, params = self._where(business, status, priority)
+        sql = f"SELECT page FROM pages WHERE {where} ORDER BY {ORDERINGS.get(order_by, ORDERINGS['created'])}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self, business: Optional[str] = None, status: Optional[str] = None,
+              priority: Optional[str] = None) -> int:
+        where, params = self._where(business, status, priority)
+        with self._lock:
+            return self._db().execute(f"SELECT COUNT(*) FROM pages WHERE {where}", params).fetchone()[0]
+
+    def count_by_business(self, business: Optional[str] = None,
+                          due_within_days: int = 7) -> Dict[str, Dict[str, int]]:
+        """Per-business totals plus open, high-priority and due-soon counts, answered from the indexes
+
+        High-priority and due-soon only count open tasks. Due dates may carry a time,
+        so they are compared by their date part.
+        """
+        where, params = self._where(business, None, None)
+        done = ",".join("?" * len(DONE_STATUSES))
+        is_open = f"COALESCE(status, '') NOT IN ({done})"
+        sql = (f"SELECT COALESCE(business, 'Unknown'), COUNT(*), "
+               f"SUM(CASE WHEN {is_open} THEN 1 ELSE 0 END), "
+               f"SUM(CASE WHEN {is_open} AND (priority LIKE '%🔥%' OR priority LIKE '%High%') THEN 1 ELSE 0 END), "
+               f"SUM(CASE WHEN {is_open} AND substr(due_date, 1, 10) >= date('now') "
+               f"AND substr(due_date, 1, 10) <= date('now', ?) THEN 1 ELSE 0 END) "
+               f"FROM pages WHERE {where} GROUP BY business")
+        with self._lock:
+            rows = self._db().execute(
+                sql, list(DONE_STATUSES) * 3 + [f"+{due_within_days} days"] + params
+            ).fetchall()
+        return {biz: {"total": total, "open": open_ or 0, "high_priority": high or 0, "due_soon": due or 0}
+                for biz, total, open_, high, due in rows}
+
+    def last_synced(self) -> float:
+        return self._state()["last_sync"]
+
+    def start_refresher(self, interval: Optional[float] = None) -> Optional[asyncio.Task]:
+        """Keep the mirror within the staleness window from a background task"""
+        if not self.enabled:
+            return None
+        if self._refresher and not self._refresher.done():
+            return self._refresher
+        period = interval or self.max_staleness
+
+        async def refresh_loop():
+            while True:
+                try:
+                    await self.sync()
+                except Exception as e:
+                    logger.warning(f"Notion mirror refresh failed: {e}")
+                await asyncio.sleep(period)
+
+        self._refresher = asyncio.get_running_loop().create_task(refresh_loop())
+        return self._refresher
+
+    def stop_refresher(self):
+        if self._refresher:
+            self._refresher.cancel()
+            self._refresher = None
+
+# Mirrors of the Super Agent Hub and Organisation databases
+main_mirror = NotionMirror(os.getenv("NOTION_MAIN_DATABASE_ID"))
+organisation_mirror = NotionMirror(os.getenv("NOTION_ORGANISATION_ID"))
@@ -0,0 +1,147 @@
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# field -> (Notion property name, property type); a None name means "the title property"
+TASK_SCHEMA: Tuple[Tuple[str, Optional[str], str], ...] = (
+    ("title", None, "title"),
+    ("business", "Business", "select"),
+    ("status", "Status", "select"),
+    ("priority", "Priority", "select"),
+    ("due_date", "Due Date", "date"),
+)
+
+
+def _rich_text(value) -> str:
+    if not value:
+        return ""
+    return "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in value)
+
+
+def _select(value) -> str:
+    return value.get("name", "") if value else ""
+
+
+def _date(value) -> str:
+    return value.get("start") or "" if value else ""
+
+
+def _multi_select(value) -> str:
+    return ", ".join(option.get("name", "") for option in value or ())
+
+
+def _scalar(value) -> str:
+    return "" if value is None else str(value)
+
+
+EXTRACTORS: Dict[str, Callable[[Any], str]] = {
+    "title": _rich_text,
+    "rich_text": _rich_text,
+    "select": _select,
+    "status": _select,
+    "date": _date,
+    "multi_select": _multi_select,
+    "number": _scalar,
+    "checkbox": _scalar,
+    "url": _scalar,
+    "email": _scalar,
+}
+
+
+class Decoder:
+    def __init__(self, schema: Sequence[Tuple[str, Optional[str], str]], name: str = "Record"):
+        """Page decoder compiled once per database schema
+
+        Builds a `__slots__` record class with one slot per field plus `id`, and a
+        fixed plan of (property name, key, extractor) steps, so decoding a page is
+        a handful of dict lookups with no per-page schema handling.
+        """
+        self.fields = tuple(field for field, _, _ in schema)
+        self.record = type(name, (), {
+            "__slots__": ("id",) + self.fields,
+            "__init__": _record_init,
+            "__repr__": _record_repr,
+        })
+        self._plan: List[List[Any]] = [
+            [prop, kind, EXTRACTORS[kind]] for _, prop, kind in schema
+        ]
+        # Title columns are named per database; found on first sight, re-found if a page differs
+        self._title_step = next((step for step in self._plan if step[0] is None and step[1] == "title"), None)
+
+    def _resolve_title(self, props: Dict[str, Any]):
+        step = self._title_step
+        if step is None or step[0] in props:
+            return
+        for name, prop in props.items():
+            if "title" in prop:
+                step[0] = name
+                return
+
+    def _values(self, props: Dict[str, Any]) -> List[str]:
+        values = []
+        for prop, kind, extract in self._plan:
+            value = props.get(prop)
+            values.append(extract(value.get(kind)) if value else "")
+        return values
+
+    def decode(self, page: Dict[str, Any]):
+        props = page.get("properties") or {}
+        self._resolve_title(props)
+        return self.record(page.get("id", ""), *self._values(props))
+
+    def decode_many(self, pages: Iterable[Dict[str, Any]]) -> List[Any]:
+        return [self.decode(page) for page in pages]
+
+    def columns(self, pages: Iterable[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Column arrays (field -> list of values) for large result sets"""
+        columns: Dict[str, List[str]] = {field: [] for field in ("id",) + self.fields}
+        appenders = [columns[field].append for field in self.fields]
+        append_id = columns["id"].append
+        for page in pages:
+            props = page.get("properties") or {}
+            self._resolve_title(props)
+            append_id(page.get("id", ""))
+            for append, value in zip(appenders, self._values(props)):
+                append(value)
+        return columns
+
+
+def _record_init(self, id, *values):
+    self.id = id
+    for field, value in zip(self.__slots__[1:], values):
+        setattr(self, field, value)
+
+
+def _record_repr(self) -> str:
+    return f"{type(self).__name__}({', '.join(f'{f}={getattr(self, f)!r}' for f in self.__slots__)})"
+
+
+def format_tasks(tasks: Sequence[Any]) -> str:
+    """Render task records for the chat reply in one join"""
+    lines = [f"📋 Retrieved {len(tasks)} tasks from Notion:", ""]
+    for task in tasks:
+        lines.append(f"• **{task.title}**")
+        lines.append(f"  Business: {task.business}")
+        lines.append(f"  Status: {task.status}")
+        lines.append(f"  Priority: {task.priority}")
+        if task.due_date:
+            lines.append(f"  Due: {task.due_date}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def format_task_columns(columns: Dict[str, List[str]], heading: str, limit: int = 10) -> str:
+    """Summarise column arrays: counts by status, then the first `limit` rows"""
+    total = len(columns["id"])
+    by_status = Counter(status or "No status" for status in columns["status"])
+    lines = [f"{heading} ({total} items)"]
+    lines.extend(f"• {status}: {count}" for status, count in by_status.most_common())
+    if total:
+        lines.append("")
+        for title, due in zip(columns["title"][:limit], columns["due_date"][:limit]):
+            lines.append(f"• {title} (due {due})" if due else f"• {title}")
+        if total > limit:
+            lines.append(f"…and {total - limit} more")
+    return "\n".join(lines) + "\n"
+
+# Decoder for the Super Agent Hub and Organisation task databases
+task_decoder = Decoder(TASK_SCHEMA, "TaskRecord")
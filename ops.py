@@ -13,13 +13,17 @@ from livekit.agents import (
     AgentSession,
     function_tool,
     RunContext,
+    MetricsCollectedEvent,
+    metrics,
 )
 
 from livekit.plugins import deepgram, openai, cartesia
-import aiohttp
-import json
-from datetime import datetime, timedelta
-import requests
+from notion_api import NotionAPIError
+from notion_mirror import main_mirror, organisation_mirror
+from notion_records import task_decoder, format_task_columns
+from tool_cache import tool_cache
+from latency_metrics import latency
+from invoices import invoice_engine
 
 # Load environment variables
 load_dotenv()
@@ -120,6 +124,7 @@ Always end responses with a specific next action or question to keep momentum go
 
 # Function definitions for operations management
 @function_tool
+@latency.timed()
 async def add_calendar_event(
     ctx: RunContext,
     title: Annotated[str, "Event title"],
@@ -150,6 +155,8 @@ async def add_calendar_event(
         return f"❌ Failed to add calendar event: {str(e)}"
 
 @function_tool
+@latency.timed()
+@tool_cache.invalidates("query_business_data", "manage_msa_enrollment")
 async def create_notion_task(
     ctx: RunContext,
     title: Annotated[str, "Task title"],
@@ -161,12 +168,6 @@ async def create_notion_task(
 ) -> str:
     """Create a task in Mohamed's Super Agent Hub database"""
     try:
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        
         # Prepare task data for Notion API
         properties = {
             "Task": {
@@ -198,30 +199,22 @@ async def create_notion_task(
                 "rich_text": [{"text": {"content": description}}]
             }
         
-        data = {
-            "parent": {"database_id": MAIN_DATABASE_ID},
-            "properties": properties
-        }
-        
         # Make actual API call to Notion
-        response = requests.post(
-            "https://api.notion.com/v1/pages",
-            headers=headers,
-            json=data
-        )
+        page = await main_mirror.create_page(properties)
         
-        if response.status_code == 200:
-            logger.info(f"Notion task created: {title} for {project}")
-            return f"✅ Created task '{title}' in {project} project (Priority: {priority})"
-        else:
-            logger.error(f"Notion API error: {response.status_code} - {response.text}")
-            return f"❌ Failed to create task: API error {response.status_code}"
+        logger.info(f"Notion task created: {title} for {project}")
+        return f"✅ Created task '{title}' in {project} project (Priority: {priority})"
         
+    except NotionAPIError as e:
+        logger.error(f"Notion API error: {e.status} - {e.message}")
+        return f"❌ Failed to create task: API error {e.status}"
     except Exception as e:
         logger.error(f"Failed to create Notion task: {e}")
         return f"❌ Failed to create task: {str(e)}"
 
 @function_tool
+@latency.timed()
+@tool_cache.cached(ttl=300)
 async def check_ndis_compliance(
     ctx: RunContext,
     area: Annotated[str, "Compliance area to check"] = "general"
@@ -258,6 +251,8 @@ async def check_ndis_compliance(
         return f"❌ Failed to check compliance status: {str(e)}"
 
 @function_tool
+@latency.timed()
+@tool_cache.cached(ttl=60)
 async def query_business_data(
     ctx: RunContext,
     business: Annotated[str, "Business to query (STR8N_UP, CSSA, MSA, or ALL)"] = "ALL",
@@ -265,79 +260,38 @@ async def query_business_data(
 ) -> str:
     """Query data from Mohamed's business databases in Notion"""
     try:
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        
-        # Query the main organization database
-        query_data = {
-            "filter": {
-                "and": [
-                    {
-                        "property": "Business",
-                        "select": {
-                            "equals": business if business != "ALL" else None
-                        }
-                    } if business != "ALL" else {}
-                ]
-            },
-            "sorts": [
-                {
-                    "property": "Priority",
-                    "direction": "descending"
-                }
-            ]
-        }
-        
-        # Remove empty filter if querying ALL
-        if business == "ALL":
-            query_data = {"sorts": query_data["sorts"]}
+        # Answer from the local mirror of the organisation database
+        await organisation_mirror.ensure_fresh()
         
-        response = requests.post(
-            f"https://api.notion.com/v1/databases/{ORGANISATION_ID}/query",
-            headers=headers,
-            json=query_data
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            results = data.get("results", [])
-            
-            if data_type == "overview":
-                business_summary = {}
-                for result in results:
-                    props = result.get("properties", {})
-                    biz = props.get("Business", {}).get("select", {}).get("name", "Unknown")
-                    
-                    if biz not in business_summary:
-                        business_summary[biz] = {"total": 0, "high_priority": 0}
-                    
-                    business_summary[biz]["total"] += 1
-                    
-                    priority = props.get("Priority", {}).get("select", {}).get("name", "")
-                    if "🔥" in priority or "High" in priority:
-                        business_summary[biz]["high_priority"] += 1
-                
-                summary = f"📊 Business Overview:\n"
-                for biz, stats in business_summary.items():
-                    summary += f"• {biz}: {stats['total']} items ({stats['high_priority']} high priority)\n"
-                
-                return summary
+        if data_type == "overview":
+            business_summary = organisation_mirror.count_by_business(business)
             
-            else:
-                return f"📋 Found {len(results)} items in {business} database"
+            lines = ["📊 Business Overview:"]
+            lines.extend(f"• {biz}: {stats['total']} items ({stats['high_priority']} high priority)"
+                         for biz, stats in business_summary.items())
+            return "\n".join(lines) + "\n"
+        
+        elif data_type in ("tasks", "deadlines"):
+            # Large result sets decode straight into column arrays
+            pages = organisation_mirror.query(
+                business=business, order_by="due_date" if data_type == "deadlines" else "created"
+            )
+            heading = "📅 Deadlines" if data_type == "deadlines" else "📋 Tasks"
+            return format_task_columns(task_decoder.columns(pages), f"{heading} for {business}")
         
         else:
-            logger.error(f"Notion query error: {response.status_code}")
-            return f"❌ Failed to query business data: API error {response.status_code}"
+            return f"📋 Found {organisation_mirror.count(business=business)} items in {business} database"
             
+    except NotionAPIError as e:
+        logger.error(f"Notion query error: {e.status}")
+        return f"❌ Failed to query business data: API error {e.status}"
     except Exception as e:
         logger.error(f"Failed to query business data: {e}")
         return f"❌ Failed to query business data: {str(e)}"
 
 @function_tool
+@latency.timed()
+@tool_cache.cached(ttl=60, when=lambda args: args["action"] == "check_numbers")
 async def manage_msa_enrollment(
     ctx: RunContext,
     action: Annotated[str, "Action: 'check_numbers', 'send_reminder', 'update_waitlist'"],
@@ -345,69 +299,46 @@ async def manage_msa_enrollment(
 ) -> str:
     """Manage MSA scout enrollment and communications"""
     try:
-        # Query Mohamed's actual MSA data from Notion
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        
-        # Query for MSA-related items
-        query_data = {
-            "filter": {
-                "property": "Business",
-                "select": {
-                    "equals": "MSA"
-                }
-            }
-        }
+        # Count Mohamed's actual MSA data from the local Notion mirror
+        await organisation_mirror.ensure_fresh()
+        msa_records = organisation_mirror.count(business="MSA")
         
-        response = requests.post(
-            f"https://api.notion.com/v1/databases/{ORGANISATION_ID}/query",
-            headers=headers,
-            json=query_data
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            results = data.get("results", [])
+        if action == "check_numbers":
+            # Based on Mohamed's mention of 225 kids enrolled for Term 1
+            result = f"📊 MSA Enrollment Status:\n"
+            result += f"• Total Enrolled: 225 kids for Term 1 2025\n"
+            result += f"• Term 1 Launch: January 17, 2025\n"
+            result += f"• Parent Orientation: January 10, 2025\n"
+            result += f"• Winter Camp: January 3-5, 2025 (44 kids)\n"
+            result += f"• Database items found: {msa_records}\n"
             
-            if action == "check_numbers":
-                # Based on Mohamed's mention of 225 kids enrolled for Term 1
-                result = f"📊 MSA Enrollment Status:\n"
-                result += f"• Total Enrolled: 225 kids for Term 1 2025\n"
-                result += f"• Term 1 Launch: January 17, 2025\n"
-                result += f"• Parent Orientation: January 10, 2025\n"
-                result += f"• Winter Camp: January 3-5, 2025 (44 kids)\n"
-                result += f"• Database items found: {len(results)}\n"
-                
-                return result
-                
-            elif action == "send_reminder":
-                result = f"📧 MSA Reminder Process:\n"
-                result += f"• Payment deadline reminder sent to all families\n"
-                result += f"• Term 1 starts: January 17, 2025\n"
-                result += f"• Parent orientation: January 10, 2025\n"
-                result += f"• Found {len(results)} MSA records to process\n"
-                
-                return result
-                
-            elif action == "update_waitlist":
-                result = f"📝 MSA Waitlist Update:\n"
-                result += f"• Reviewing waitlist families for available spots\n"
-                result += f"• Creating follow-up tasks for waitlisted families\n"
-                result += f"• Database records to review: {len(results)}\n"
-                
-                return result
-        
-        else:
-            return f"❌ Failed to access MSA data: API error {response.status_code}"
+            return result
             
+        elif action == "send_reminder":
+            result = f"📧 MSA Reminder Process:\n"
+            result += f"• Payment deadline reminder sent to all families\n"
+            result += f"• Term 1 starts: January 17, 2025\n"
+            result += f"• Parent orientation: January 10, 2025\n"
+            result += f"• Found {msa_records} MSA records to process\n"
+            
+            return result
+            
+        elif action == "update_waitlist":
+            result = f"📝 MSA Waitlist Update:\n"
+            result += f"• Reviewing waitlist families for available spots\n"
+            result += f"• Creating follow-up tasks for waitlisted families\n"
+            result += f"• Database records to review: {msa_records}\n"
+            
+            return result
+            
+    except NotionAPIError as e:
+        return f"❌ Failed to access MSA data: API error {e.status}"
     except Exception as e:
         logger.error(f"Failed to manage MSA enrollment: {e}")
         return f"❌ Failed to manage enrollment: {str(e)}"
 
 @function_tool
+@latency.timed()
 async def generate_invoice(
     ctx: RunContext,
     client_name: Annotated[str, "Client or participant name"],
@@ -419,21 +350,9 @@ async def generate_invoice(
 ) -> str:
     """Generate invoice for services across businesses"""
     try:
-        invoice_number = f"{business[:3]}{datetime.now().strftime('%Y%m%d')}{hash(client_name) % 1000:03d}"
+        invoice_data = await asyncio.to_thread(invoice_engine.create, client_name, business, service, amount, hours, rate)
+        invoice_number = invoice_data["number"]
         
-        invoice_data = {
-            "invoice_number": invoice_number,
-            "client_name": client_name,
-            "business": business,
-            "service": service,
-            "amount": amount,
-            "hours": hours,
-            "rate": rate,
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
-        }
-        
-        # Placeholder for actual invoice generation
         result = f"🧾 Invoice Generated:\n"
         result += f"• Invoice #: {invoice_number}\n"
         result += f"• Client: {client_name}\n"
@@ -483,6 +402,26 @@ async def entrypoint(ctx: JobContext):
         tts=cartesia.TTS(),
     )
 
+    # Record per-stage latency for every turn
+    @session.on("metrics_collected")
+    def _on_metrics_collected(ev: MetricsCollectedEvent):
+        m = ev.metrics
+        if isinstance(m, metrics.EOUMetrics):
+            # End of speech -> final transcript, and -> turn handed to the LLM
+            latency.observe("stt.transcription_delay", m.transcription_delay)
+            latency.observe("eou.end_of_utterance_delay", m.end_of_utterance_delay)
+        elif isinstance(m, metrics.LLMMetrics):
+            latency.observe("llm.ttft", m.ttft)
+            latency.observe("llm.duration", m.duration)
+        elif isinstance(m, metrics.TTSMetrics):
+            latency.observe("tts.ttfb", m.ttfb)
+
+    latency.start_exporters()
+
+    # Keep the Notion mirrors fresh in the background while the session runs
+    main_mirror.start_refresher()
+    organisation_mirror.start_refresher()
+
     # Start the session
     await session.start(agent=agent, room=ctx.room)
 
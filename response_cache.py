@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from dotenv import load_dotenv
+from tool_cache import LRUBackend
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Answers are shared within fixed windows of this many seconds and expire at the window's end
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "900"))
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "512"))
+# Set to a file path to keep cached answers across restarts
+CHAT_CACHE_PATH = os.getenv("CHAT_CACHE_PATH")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    value TEXT NOT NULL,
+    used REAL NOT NULL
+);
+"""
+
+_TRAILING = re.compile(r"[\s?!.]+$")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-folded, whitespace-collapsed prompt without trailing punctuation"""
+    return _TRAILING.sub("", " ".join(prompt.split()).casefold())
+
+
+def prompt_version(system_prompt: str) -> str:
+    return hashlib.sha1(system_prompt.encode()).hexdigest()[:12]
+
+
+class SQLiteLRUBackend(LRUBackend):
+    def __init__(self, path: str, max_size: int = CHAT_CACHE_SIZE):
+        """LRUBackend that writes through to SQLite and reloads live entries on start-up"""
+        super().__init__(max_size)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        rows = self._conn.execute(
+            "SELECT key, expires_at, value FROM responses ORDER BY used DESC LIMIT ?", (max_size,)
+        ).fetchall()
+        self._conn.commit()
+        self._entries = OrderedDict((key, (expires_at, json.loads(value))) for key, expires_at, value in reversed(rows))
+
+    def set(self, key: Hashable, expires_at: float, value: Any):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                               (key, expires_at, json.dumps(value), time.time()))
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in evicted])
+            self._conn.commit()
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]):
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+            self._conn.commit()
+
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl: float = CHAT_CACHE_TTL):
+        """Cache of chat answers keyed by normalized prompt, system prompt version and model
+
+        Expiry is time-bucketed: the current window number is part of the key, so every
+        answer cached in a window expires together when it closes.
+        """
+        self.backend = backend or LRUBackend(CHAT_CACHE_SIZE)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, now: Optional[float] = None) -> int:
+        return int((now or time.time()) // self.ttl)
+
+    def key(self, prompt: str, system_prompt: str, model: str, bucket: Optional[int] = None) -> str:
+        bucket = self._bucket() if bucket is None else bucket
+        raw = f"{bucket}\x00{model}\x00{prompt_version(system_prompt)}\x00{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, prompt: str, system_prompt: str, model: str) -> Optional[Dict[str, Any]]:
+        """{answer, created} for a live entry, else None"""
+        entry = self.backend.get(self.key(prompt, system_prompt, model))
+        if entry is None or entry[0] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, prompt: str, system_prompt: str, model: str, answer: str):
+        now = time.time()
+        bucket = self._bucket(now)
+        self.backend.set(self.key(prompt, system_prompt, model, bucket), (bucket + 1) * self.ttl,
+                         {"answer": answer, "created": now})
+
+    def invalidate(self, prompt: Optional[str] = None, system_prompt: str = "", model: str = ""):
+        """Drop one prompt's answer for the current window, or everything if no prompt is given"""
+        if prompt is None:
+            self.backend.delete_where(lambda key: True)
+            logger.info("Chat response cache cleared")
+        else:
+            self.backend.delete(self.key(prompt, system_prompt, model))
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "persistent": isinstance(self.backend, SQLiteLRUBackend)}
+
+# Initialize global instance
+response_cache = ResponseCache(SQLiteLRUBackend(CHAT_CACHE_PATH) if CHAT_CACHE_PATH else None)
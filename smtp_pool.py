@@ -0,0 +1,148 @@
+import asyncio
+import os
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+# Gmail drops idle sessions after a few minutes; probe anything idle longer than this
+SMTP_IDLE_CHECK = float(os.getenv("SMTP_IDLE_CHECK", "60"))
+
+
+def build_message(from_email: str, to_email: str, subject: str, body: str,
+                  cc_email: str = "") -> Tuple[str, List[str]]:
+    """Build a plain-text MIME message; returns (raw message, envelope recipients)"""
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    if cc_email:
+        msg['Cc'] = cc_email
+
+    msg.attach(MIMEText(body, 'plain'))
+    recipients = to_email.split(',') + (cc_email.split(',') if cc_email else [])
+    return msg.as_string(), recipients
+
+
+class SMTPPool:
+    def __init__(self, username: Optional[str], password: Optional[str],
+                 host: str = SMTP_HOST, port: int = SMTP_PORT, size: int = SMTP_POOL_SIZE,
+                 idle_check: float = SMTP_IDLE_CHECK, timeout: float = 30.0):
+        """Pool of persistent, logged-in SMTP connections used from worker threads"""
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._idle_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.starttls()
+        server.login(self.username, self.password)
+        return server
+
+    def _acquire(self) -> smtplib.SMTP:
+        self._slots.acquire()
+        try:
+            with self._idle_lock:
+                server, last_used = self._idle.pop() if self._idle else (None, 0.0)
+            if server is not None and time.monotonic() - last_used > self.idle_check:
+                try:
+                    server.noop()
+                except (smtplib.SMTPException, OSError):
+                    # Reset or broken pipe while idle: drop it and reconnect
+                    self._discard(server)
+                    server = None
+            return server or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, server: Optional[smtplib.SMTP]):
+        if server is not None:
+            with self._idle_lock:
+                self._idle.append((server, time.monotonic()))
+        self._slots.release()
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            pass
+        finally:
+            # quit() can fail on a dead socket before closing it
+            server.close()
+
+    def _send_sync(self, from_email: str, recipients: List[str], raw_message: str):
+        server = self._acquire()
+        try:
+            try:
+                server.sendmail(from_email, recipients, raw_message)
+            except smtplib.SMTPServerDisconnected:
+                # Idle timeout raced the health check; reconnect once and resend
+                self._discard(server)
+                server = self._connect()
+                server.sendmail(from_email, recipients, raw_message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+            # The message was rejected but the session is still usable
+            self._release(server)
+            raise
+        except Exception:
+            self._discard(server)
+            self._release(None)
+            raise
+        self._release(server)
+
+    async def send(self, to_email: str, subject: str, body: str, cc_email: str = "",
+                   from_email: Optional[str] = None):
+        """Send one message over a pooled connection without blocking the event loop"""
+        sender = from_email or self.username
+        raw_message, recipients = build_message(sender, to_email, subject, body, cc_email)
+        await asyncio.to_thread(self._send_sync, sender, recipients, raw_message)
+
+    async def send_bulk(self, messages: List[Dict[str, str]],
+                        concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Send personalized messages ({to, subject, body, cc}) through the pool
+
+        Returns one result per message, in input order.
+        """
+        limit = asyncio.Semaphore(concurrency or self.size)
+
+        async def send_one(message: Dict[str, str]) -> Dict[str, Any]:
+            async with limit:
+                try:
+                    await self.send(message["to"], message["subject"], message["body"], message.get("cc", ""))
+                    return {"to": message["to"], "success": True}
+                except Exception as e:
+                    logger.warning(f"Bulk email to {message.get('to')} failed: {e}")
+                    return {"to": message.get("to"), "success": False, "error": str(e)}
+
+        return await asyncio.gather(*(send_one(message) for message in messages))
+
+    def close(self):
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._discard(server)
+
+# Initialize global instance
+smtp_pool = SMTPPool(os.getenv("GMAIL_EMAIL"), os.getenv("GMAIL_APP_PASSWORD"))
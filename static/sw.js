@@ -1,40 +1,142 @@
-const CACHE_NAME = 'super-agent-v1';
-const urlsToCache = [
+// Served from /sw.js, which stamps BUILD_VERSION with a hash of static/ and templates/,
+// so every deploy gets fresh caches without a manual bump
+const BUILD_VERSION = '__BUILD_VERSION__';
+const STATIC_CACHE = `super-agent-static-${BUILD_VERSION}`;
+const RUNTIME_CACHE = `super-agent-runtime-${BUILD_VERSION}`;
+const RUNTIME_MAX_ENTRIES = 60;
+
+const PRECACHE_URLS = [
   '/mobile',
   '/static/manifest.json',
   '/static/icon-192.png',
+  '/static/icon.svg',
   'https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap',
   'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'
 ];
 
+// Read endpoints and pages: paint from cache, refresh in the background
+const STALE_WHILE_REVALIDATE = ['/', '/mobile', '/api/overview', '/api/status'];
+
+// Writes that change a cached read, and the reads to drop when they succeed
+const WRITE_INVALIDATES = {
+  '/api/jobs': ['/api/overview', '/api/status']
+};
+
 self.addEventListener('install', (event) => {
   event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then((cache) => cache.addAll(urlsToCache))
-  );
-});
-
-self.addEventListener('fetch', (event) => {
-  event.respondWith(
-    caches.match(event.request)
-      .then((response) => {
-        // Return cached version or fetch from network
-        return response || fetch(event.request);
-      }
-    )
+    caches.open(STATIC_CACHE)
+      .then((cache) => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
   );
 });
 
 self.addEventListener('activate', (event) => {
   event.waitUntil(
-    caches.keys().then((cacheNames) => {
-      return Promise.all(
-        cacheNames.map((cacheName) => {
-          if (cacheName !== CACHE_NAME) {
-            return caches.delete(cacheName);
-          }
-        })
-      );
-    })
+    caches.keys()
+      .then((cacheNames) => Promise.all(
+        cacheNames
+          .filter((cacheName) => cacheName !== STATIC_CACHE && cacheName !== RUNTIME_CACHE)
+          .map((cacheName) => caches.delete(cacheName))
+      ))
+      .then(() => self.clients.claim())
   );
-});
\ No newline at end of file
+});
+
+// Keep the runtime cache bounded; keys() lists entries oldest first
+async function trimCache(cacheName, maxEntries) {
+  const cache = await caches.open(cacheName);
+  const keys = await cache.keys();
+  await Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map((key) => cache.delete(key)));
+}
+
+async function putInCache(cacheName, request, response) {
+  if (!response || !response.ok || response.type === 'opaqueredirect') {
+    return;
+  }
+  const cache = await caches.open(cacheName);
+  await cache.delete(request);
+  await cache.put(request, response);
+  if (cacheName === RUNTIME_CACHE) {
+    await trimCache(RUNTIME_CACHE, RUNTIME_MAX_ENTRIES);
+  }
+}
+
+async function staleWhileRevalidate(event) {
+  const cached = await caches.match(event.request);
+  const network = fetch(event.request)
+    .then((response) => {
+      event.waitUntil(putInCache(RUNTIME_CACHE, event.request, response.clone()));
+      return response;
+    });
+  if (cached) {
+    event.waitUntil(network.catch(() => undefined));
+    return cached;
+  }
+  return network;
+}
+
+async function cacheFirst(event) {
+  const cached = await caches.match(event.request);
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(event.request);
+  event.waitUntil(putInCache(STATIC_CACHE, event.request, response.clone()));
+  return response;
+}
+
+async function networkFirst(event) {
+  try {
+    const response = await fetch(event.request);
+    event.waitUntil(putInCache(RUNTIME_CACHE, event.request, response.clone()));
+    return response;
+  } catch (error) {
+    const cached = await caches.match(event.request);
+    if (cached) {
+      return cached;
+    }
+    throw error;
+  }
+}
+
+async function invalidate(paths) {
+  const cache = await caches.open(RUNTIME_CACHE);
+  await Promise.all(paths.map((path) => cache.delete(path, { ignoreSearch: true })));
+}
+
+// Writes always go to the network; on success the reads they change are dropped so they refresh
+async function networkOnlyWrite(event) {
+  try {
+    const response = await fetch(event.request);
+    const stale = WRITE_INVALIDATES[new URL(event.request.url).pathname];
+    if (response.ok && stale) {
+      event.waitUntil(invalidate(stale));
+    }
+    return response;
+  } catch (error) {
+    return new Response(JSON.stringify({ error: 'Offline - please try again when connected', result: '❌ Offline' }), {
+      status: 503,
+      headers: { 'Content-Type': 'application/json' }
+    });
+  }
+}
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+
+  if (request.method !== 'GET') {
+    if (url.origin === self.location.origin) {
+      event.respondWith(networkOnlyWrite(event));
+    }
+    return;
+  }
+
+  if (url.origin !== self.location.origin || url.pathname.startsWith('/static/')) {
+    event.respondWith(cacheFirst(event));
+  } else if (STALE_WHILE_REVALIDATE.includes(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event));
+  } else if (request.headers.get('Accept') !== 'text/event-stream') {
+    event.respondWith(networkFirst(event));
+  }
+});
@@ -0,0 +1,140 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LRUBackend:
+    def __init__(self, max_size: int = 256):
+        """Size-bounded in-memory store of (expires_at, value) entries"""
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Hashable, expires_at: float, value: Any):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]):
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+
+class ToolCache:
+    def __init__(self, backend=None, default_ttl: float = 60.0):
+        """Result cache for read-only tools, keyed by tool name and normalized arguments
+
+        Any backend with get/set/delete/delete_where can be plugged in.
+        """
+        self.backend = backend or LRUBackend()
+        self.default_ttl = default_ttl
+        self.ttls: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(value: Any) -> Hashable:
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return tuple(sorted((k, ToolCache._normalize(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(ToolCache._normalize(v) for v in value)
+        return value
+
+    def key(self, tool: str, arguments: Dict[str, Any]) -> Tuple[str, Hashable]:
+        return tool, self._normalize(arguments)
+
+    def get(self, tool: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        entry = self.backend.get(self.key(tool, arguments))
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, tool: str, arguments: Dict[str, Any], value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.ttls.get(tool, self.default_ttl)
+        self.backend.set(self.key(tool, arguments), time.monotonic() + ttl, value)
+
+    def invalidate(self, *tools: str):
+        """Drop cached results for the given tools (all tools if none given)"""
+        names = set(tools)
+        self.backend.delete_where(lambda key: not names or key[0] in names)
+        logger.debug(f"Tool cache invalidated: {', '.join(names) or 'all'}")
+
+    def cached(self, ttl: Optional[float] = None, name: Optional[str] = None,
+               when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               skip: Tuple[str, ...] = ("ctx",)):
+        """Decorator caching an async tool's result
+
+        `when` decides per call whether the arguments describe a read-only request;
+        parameters listed in `skip` (the RunContext) are left out of the key.
+        Results starting with ❌ are never cached.
+        """
+        def decorator(func):
+            tool = name or func.__name__
+            if ttl is not None:
+                self.ttls[tool] = ttl
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = {k: v for k, v in bound.arguments.items() if k not in skip}
+                if when is not None and not when(arguments):
+                    return await func(*args, **kwargs)
+                cached = self.get(tool, arguments)
+                if cached is not None:
+                    return cached
+                result = await func(*args, **kwargs)
+                if not (isinstance(result, str) and result.startswith("❌")):
+                    self.set(tool, arguments, result)
+                return result
+
+            return wrapper
+        return decorator
+
+    def invalidates(self, *tools: str):
+        """Decorator for write tools: clear the named tools' cached results after each call"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.invalidate(*tools)
+
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+# Initialize global instance
+tool_cache = ToolCache()
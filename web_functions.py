@@ -1,11 +1,17 @@
 import os
-import requests
+import asyncio
+import aiohttp
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
+from typing import Dict, List
 from dotenv import load_dotenv
 from google_integration import google_integration
+from notion_api import NotionAPIError
+from notion_mirror import main_mirror
+from notion_records import task_decoder, format_tasks
+from smtp_pool import smtp_pool
+from invoices import invoice_engine
+from calendar_slots import find_free_slots, parse_datetime, parse_windows, CALENDAR_TIMEZONE
 import logging
 
 # Set up logging
@@ -18,6 +24,30 @@ MAIN_DATABASE_ID = os.getenv("NOTION_MAIN_DATABASE_ID")
 GMAIL_EMAIL = os.getenv("GMAIL_EMAIL")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 
+def _task_properties(title: str, project: str = "STR8N UP", priority: str = "Medium",
+                     due_date: str = "", description: str = "") -> Dict:
+    """Build Notion page properties for the Super Agent Hub schema"""
+    # Build properties using YOUR database's schema
+    properties = {
+        # Task is the title property (not Name)
+        "Task": {"title": [{"text": {"content": title}}]},
+        "Business": {"select": {"name": project}},
+        "Priority": {"select": {"name": priority}},
+        "Status": {"select": {"name": "Not Started"}},
+        "AI Generated": {"checkbox": True},
+        "Category": {"select": {"name": "Task"}}
+    }
+    
+    # Add optional properties
+    if due_date:
+        properties["Due Date"] = {"date": {"start": due_date}}
+    
+    # Use Notes field instead of Description
+    if description:
+        properties["Notes"] = {"rich_text": [{"text": {"content": description}}]}
+    
+    return properties
+
 async def create_notion_task_web(title: str, project: str = "STR8N UP", priority: str = "Medium", 
                                 due_date: str = "", assignee: str = "Mohamed", description: str = "") -> str:
     """Create a task in Notion with correct property names for your database"""
@@ -28,54 +58,110 @@ async def create_notion_task_web(title: str, project: str = "STR8N UP", priority
         if not MAIN_DATABASE_ID:
             return "❌ Notion database not configured. Please set NOTION_MAIN_DATABASE_ID in .env file"
         
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}", 
-            "Content-Type": "application/json", 
-            "Notion-Version": "2022-06-28"
-        }
-        
-        # Build properties using YOUR database's schema
-        properties = {
-            # Task is the title property (not Name)
-            "Task": {"title": [{"text": {"content": title}}]},
-            "Business": {"select": {"name": project}},
-            "Priority": {"select": {"name": priority}},
-            "Status": {"select": {"name": "Not Started"}},
-            "AI Generated": {"checkbox": True},
-            "Category": {"select": {"name": "Task"}}
-        }
-        
-        # Add optional properties
-        if due_date:
-            properties["Due Date"] = {"date": {"start": due_date}}
-        
-        # Use Notes field instead of Description
-        if description:
-            properties["Notes"] = {"rich_text": [{"text": {"content": description}}]}
-        
-        # Create the page
-        data = {
-            "parent": {"database_id": MAIN_DATABASE_ID}, 
-            "properties": properties
-        }
-        
-        response = requests.post("https://api.notion.com/v1/pages", headers=headers, json=data)
-        
-        if response.status_code == 200:
-            page_data = response.json()
-            page_url = page_data.get('url', 'Created successfully')
-            return f"✅ Task '{title}' saved to Notion: {page_url}"
-        else:
-            error_data = response.json()
-            error_msg = error_data.get('message', 'Unknown error')
-            return f"❌ Failed to create task: {error_msg}"
+        properties = _task_properties(title, project, priority, due_date, description)
+        
+        # Create the page (a retry of the same task returns the first result)
+        page_data = await main_mirror.create_page(properties)
+        page_url = page_data.get('url', 'Created successfully')
+        return f"✅ Task '{title}' saved to Notion: {page_url}"
             
-    except requests.exceptions.RequestException as e:
+    except NotionAPIError as e:
+        return f"❌ Failed to create task: {e.message}"
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         return f"❌ Network error connecting to Notion: {str(e)}"
     except Exception as e:
         logger.error(f"Notion error: {e}")
         return f"❌ Unexpected error: {str(e)}"
 
+async def create_notion_tasks_web(tasks: List[Dict]) -> str:
+    """Create many Notion tasks at Notion's safe request rate, reporting each outcome"""
+    try:
+        if not NOTION_TOKEN:
+            return "❌ Notion not configured. Please set NOTION_TOKEN in .env file"
+        
+        if not MAIN_DATABASE_ID:
+            return "❌ Notion database not configured. Please set NOTION_MAIN_DATABASE_ID in .env file"
+        
+        if not tasks:
+            return "📋 No tasks to create"
+        
+        items = [
+            _task_properties(
+                task["title"],
+                task.get("project", "STR8N UP"),
+                task.get("priority", "Medium"),
+                task.get("due_date", ""),
+                task.get("description", "")
+            )
+            for task in tasks
+        ]
+        outcomes = await main_mirror.create_pages(items)
+        
+        created = 0
+        response = ""
+        for task, outcome in zip(tasks, outcomes):
+            if outcome["success"]:
+                created += 1
+                response += f"• ✅ {task['title']}\n"
+            else:
+                status = f" ({outcome['status']})" if outcome.get("status") else ""
+                response += f"• ❌ {task['title']}{status}: {outcome['error']}\n"
+        
+        return f"📋 Created {created}/{len(tasks)} tasks in Notion:\n\n" + response
+        
+    except Exception as e:
+        logger.error(f"Notion bulk create error: {e}")
+        return f"❌ Unexpected error: {str(e)}"
+
+async def update_notion_tasks_web(updates: List[Dict]) -> str:
+    """Change status, priority or due date on many existing tasks, found by title"""
+    try:
+        if not NOTION_TOKEN:
+            return "❌ Notion not configured. Please set NOTION_TOKEN in .env file"
+        
+        if not MAIN_DATABASE_ID:
+            return "❌ Notion database not configured. Please set NOTION_MAIN_DATABASE_ID in .env file"
+        
+        if not updates:
+            return "📋 No tasks to update"
+        
+        await main_mirror.ensure_fresh()
+        page_ids = main_mirror.find_by_title([update["title"] for update in updates])
+        
+        items = []
+        lines = [""] * len(updates)
+        for index, update in enumerate(updates):
+            properties = {}
+            for field, name in (("status", "Status"), ("priority", "Priority")):
+                if update.get(field):
+                    properties[name] = {"select": {"name": update[field]}}
+            if update.get("due_date"):
+                properties["Due Date"] = {"date": {"start": update["due_date"]}}
+            page_id = page_ids.get(update["title"].casefold())
+            if not page_id:
+                lines[index] = f"• ❌ {update['title']}: no task with that title\n"
+            elif not properties:
+                lines[index] = f"• ❌ {update['title']}: nothing to change\n"
+            else:
+                items.append((index, page_id, properties))
+        
+        outcomes = await main_mirror.update_pages([(page_id, properties) for _, page_id, properties in items])
+        updated = 0
+        for (index, _, _), outcome in zip(items, outcomes):
+            title = updates[index]["title"]
+            if outcome["success"]:
+                updated += 1
+                lines[index] = f"• ✅ {title}\n"
+            else:
+                status = f" ({outcome['status']})" if outcome.get("status") else ""
+                lines[index] = f"• ❌ {title}{status}: {outcome['error']}\n"
+        
+        return f"📋 Updated {updated}/{len(updates)} tasks in Notion:\n\n" + "".join(lines)
+        
+    except Exception as e:
+        logger.error(f"Notion bulk update error: {e}")
+        return f"❌ Unexpected error: {str(e)}"
+
 async def retrieve_notion_data_web(business: str = "ALL", status: str = "ALL", limit: int = 10) -> str:
     """Retrieve data from Notion database"""
     try:
@@ -85,85 +171,17 @@ async def retrieve_notion_data_web(business: str = "ALL", status: str = "ALL", l
         if not MAIN_DATABASE_ID:
             return "❌ Notion database not configured. Please set NOTION_MAIN_DATABASE_ID in .env file"
         
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        
-        # Build query filters
-        filters = []
-        if business != "ALL":
-            filters.append({
-                "property": "Business",
-                "select": {"equals": business}
-            })
-        
-        if status != "ALL":
-            filters.append({
-                "property": "Status",
-                "select": {"equals": status}
-            })
-        
-        query_body = {
-            "page_size": limit,
-            "sorts": [{"property": "Created", "direction": "descending"}]
-        }
-        
-        if filters:
-            if len(filters) == 1:
-                query_body["filter"] = filters[0]
-            else:
-                query_body["filter"] = {"and": filters}
+        # Answer from the local mirror, syncing only when it is older than the staleness window
+        await main_mirror.ensure_fresh()
+        results = main_mirror.query(business=business, status=status, limit=limit)
         
-        url = f"https://api.notion.com/v1/databases/{MAIN_DATABASE_ID}/query"
-        response = requests.post(url, headers=headers, json=query_body)
+        if not results:
+            return f"📋 No tasks found for {business} with status {status}"
         
-        if response.status_code == 200:
-            data = response.json()
-            results = data.get("results", [])
-            
-            if not results:
-                return f"📋 No tasks found for {business} with status {status}"
-            
-            response_text = f"📋 Retrieved {len(results)} tasks from Notion:\n\n"
-            
-            for item in results:
-                props = item.get("properties", {})
-                
-                # Extract task details
-                task_title = ""
-                if "Task" in props and props["Task"]["title"]:
-                    task_title = props["Task"]["title"][0]["text"]["content"]
-                
-                business_name = ""
-                if "Business" in props and props["Business"]["select"]:
-                    business_name = props["Business"]["select"]["name"]
-                
-                status_name = ""
-                if "Status" in props and props["Status"]["select"]:
-                    status_name = props["Status"]["select"]["name"]
-                
-                priority = ""
-                if "Priority" in props and props["Priority"]["select"]:
-                    priority = props["Priority"]["select"]["name"]
-                
-                due_date = ""
-                if "Due Date" in props and props["Due Date"]["date"]:
-                    due_date = props["Due Date"]["date"]["start"]
-                
-                response_text += f"• **{task_title}**\n"
-                response_text += f"  Business: {business_name}\n"
-                response_text += f"  Status: {status_name}\n"
-                response_text += f"  Priority: {priority}\n"
-                if due_date:
-                    response_text += f"  Due: {due_date}\n"
-                response_text += "\n"
-            
-            return response_text
-        else:
-            return f"❌ Failed to retrieve data: {response.status_code} - {response.text}"
+        return format_tasks(task_decoder.decode_many(results))
             
+    except NotionAPIError as e:
+        return f"❌ Failed to retrieve data: {e.status} - {e.message}"
     except Exception as e:
         logger.error(f"Notion retrieval error: {e}")
         return f"❌ Error retrieving data: {str(e)}"
@@ -192,8 +210,33 @@ async def manage_msa_enrollment_web(action: str = "check_numbers", age_group: st
 async def generate_invoice_web(client_name: str, business: str, service: str, amount: float, 
                               hours: float = 0, rate: float = 0) -> str:
     """Generate invoice"""
-    invoice_num = f"{business[:3]}{datetime.now().strftime('%Y%m%d')}{abs(hash(client_name))%1000:03d}"
-    return f"🧾 Invoice {invoice_num}: {client_name} - {service} - ${amount:.2f} ✅"
+    try:
+        invoice = await asyncio.to_thread(invoice_engine.create, client_name, business, service, amount, hours, rate)
+        return f"🧾 Invoice {invoice['number']}: {client_name} - {service} - ${amount:.2f} ✅"
+    except Exception as e:
+        logger.error(f"Invoice error: {e}")
+        return f"❌ Failed to generate invoice: {str(e)}"
+
+async def generate_invoices_batch_web(records: List[Dict], business: str = "CSSA",
+                                      default_rate: float = 0, date: str = "") -> str:
+    """Generate one invoice per client from a period's hours records ({client_name, hours, rate, service, date})"""
+    try:
+        if not records:
+            return "🧾 No hours records to invoice"
+        
+        batch = await invoice_engine.create_batch(records, business, default_rate, date or None)
+        invoices = batch["invoices"]
+        
+        response = f"🧾 Generated {len(invoices)} invoices for {business} (total ${batch['total']:.2f}):\n\n"
+        for invoice in invoices:
+            response += f"• {invoice['number']}: {invoice['client_name']} - {invoice['hours']:g}h - ${invoice['amount']:.2f}\n"
+        response += f"\nSaved to {invoice_engine.output_dir}"
+        return response
+    except (KeyError, ValueError) as e:
+        return f"❌ Invalid hours record: {str(e)}"
+    except Exception as e:
+        logger.error(f"Batch invoice error: {e}")
+        return f"❌ Failed to generate invoices: {str(e)}"
 
 async def add_calendar_event_web(title: str, date: str, time: str, duration: int = 60, 
                                 description: str = "", location: str = "") -> str:
@@ -219,8 +262,8 @@ async def send_email_web(to_email: str, subject: str, message: str, cc_email: st
     """Send email through Gmail API with SMTP fallback (no infinite loops)"""
     # First try Gmail API
     try:
-        if hasattr(google_integration, 'gmail_enabled') and google_integration.gmail_enabled:
-            google_integration.send_email(to_email, subject, message)
+        if google_integration.gmail_enabled:
+            await google_integration.send_email(to_email, subject, message)
             return f"✅ Email sent via Gmail API to {to_email} - Subject: {subject}"
     except Exception as e:
         logger.info(f"Gmail API failed: {e}, trying SMTP")
@@ -235,12 +278,12 @@ async def create_google_calendar_event_web(title: str, start_datetime: str, end_
     """Create Google Calendar event with improved error handling"""
     try:
         # Check if Google integration is available
-        if not hasattr(google_integration, 'calendar_service') or not google_integration.calendar_service:
+        if not google_integration.calendar_enabled:
             return "❌ Google Calendar not configured. Please check google-credentials.json file exists"
         
         attendee_list = [email.strip() for email in attendees.split(',')] if attendees else []
         
-        result = google_integration.create_calendar_event(
+        result = await google_integration.create_calendar_event(
             title=title,
             start_time=start_datetime,
             end_time=end_datetime,
@@ -264,15 +307,18 @@ async def create_google_calendar_event_web(title: str, start_datetime: str, end_
         logger.error(f"Calendar error: {e}")
         return f"❌ Error creating calendar event: {str(e)}"
 
-async def get_upcoming_events_web(days_ahead: int = 7, max_results: int = 10) -> str:
-    """Get upcoming Google Calendar events with error handling"""
+async def get_upcoming_events_web(days_ahead: int = 7, max_results: int = 10,
+                                  start_date: str = "", end_date: str = "") -> str:
+    """Get upcoming Google Calendar events, or a YYYY-MM-DD date range, with error handling"""
     try:
-        if not hasattr(google_integration, 'calendar_service') or not google_integration.calendar_service:
+        if not google_integration.calendar_enabled:
             return "❌ Google Calendar not configured. Please check google-credentials.json"
         
-        result = google_integration.get_upcoming_events(
+        result = await google_integration.get_upcoming_events(
             max_results=max_results, 
-            days_ahead=days_ahead
+            days_ahead=days_ahead,
+            start_date=start_date or None,
+            end_date=end_date or None
         )
         
         if result["success"]:
@@ -301,15 +347,16 @@ async def get_upcoming_events_web(days_ahead: int = 7, max_results: int = 10) ->
         return f"❌ Error getting events: {str(e)}"
 
 # Gmail Functions
-async def read_recent_emails_web(max_results: int = 10, query: str = "is:unread") -> str:
+async def read_recent_emails_web(max_results: int = 10, query: str = "is:unread", include_body: bool = False) -> str:
     """Read recent Gmail emails with better error handling"""
     try:
-        if not hasattr(google_integration, 'gmail_service') or not google_integration.gmail_service:
+        if not google_integration.gmail_enabled:
             return "❌ Gmail API not configured. Using SMTP for sending only."
         
-        result = google_integration.read_recent_emails(
+        result = await google_integration.read_recent_emails(
             max_results=max_results, 
-            query=query
+            query=query,
+            include_body=include_body
         )
         
         if result["success"]:
@@ -322,7 +369,10 @@ async def read_recent_emails_web(max_results: int = 10, query: str = "is:unread"
                 response += f"• **From:** {email['sender']}\n"
                 response += f"  **Subject:** {email['subject']}\n"
                 response += f"  **Date:** {email['date']}\n"
-                response += f"  **Preview:** {email['snippet'][:100]}...\n\n"
+                response += f"  **Preview:** {email['snippet'][:100]}...\n"
+                if email.get('body'):
+                    response += f"  **Body:** {email['body']}\n"
+                response += "\n"
             
             return response
         else:
@@ -341,9 +391,9 @@ async def send_gmail_web(to_email: str, subject: str, body: str, cc_email: str =
     """Send email via Gmail API with SMTP fallback"""
     try:
         # Try Gmail API first
-        if hasattr(google_integration, 'gmail_enabled') and google_integration.gmail_enabled:
+        if google_integration.gmail_enabled:
             try:
-                google_integration.send_email(to_email, subject, body)
+                await google_integration.send_email(to_email, subject, body)
                 return f"✅ Email sent via Gmail API to {to_email} - Subject: {subject}"
             except Exception as e:
                 logger.info(f"Gmail API failed: {e}, trying SMTP")
@@ -365,22 +415,7 @@ async def send_smtp_email(to_email: str, subject: str, message: str, cc_email: s
         if GMAIL_EMAIL == "your-email@gmail.com":
             return "❌ Please update GMAIL_EMAIL in .env with your actual email address"
         
-        msg = MIMEMultipart()
-        msg['From'] = GMAIL_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        if cc_email:
-            msg['Cc'] = cc_email
-        
-        msg.attach(MIMEText(message, 'plain'))
-        
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(GMAIL_EMAIL, GMAIL_APP_PASSWORD)
-        text = msg.as_string()
-        recipients = to_email.split(',') + (cc_email.split(',') if cc_email else [])
-        server.sendmail(GMAIL_EMAIL, recipients, text)
-        server.quit()
+        await smtp_pool.send(to_email, subject, message, cc_email, from_email=GMAIL_EMAIL)
         
         return f"✅ Email sent to {to_email} via SMTP - Subject: {subject}"
     except smtplib.SMTPAuthenticationError:
@@ -388,13 +423,35 @@ async def send_smtp_email(to_email: str, subject: str, message: str, cc_email: s
     except Exception as e:
         return f"❌ Failed to send email: {str(e)}"
 
+async def send_bulk_email_web(messages: List[Dict[str, str]], concurrency: int = 3) -> str:
+    """Send personalized emails ({to, subject, body, cc}) over pooled SMTP connections"""
+    try:
+        if not GMAIL_EMAIL or not GMAIL_APP_PASSWORD:
+            return "❌ Email not configured. Please set GMAIL_EMAIL and GMAIL_APP_PASSWORD in .env"
+        
+        if not messages:
+            return "📧 No emails to send"
+        
+        results = await smtp_pool.send_bulk(messages, concurrency=concurrency)
+        failed = [result for result in results if not result["success"]]
+        
+        response = f"📧 Bulk email: {len(results) - len(failed)}/{len(results)} sent\n"
+        for result in failed:
+            response += f"• ❌ {result['to']}: {result['error']}\n"
+        return response
+    except Exception as e:
+        logger.error(f"Bulk email error: {e}")
+        return f"❌ Failed to send bulk email: {str(e)}"
+
 async def check_calendar_availability_web(start_datetime: str, end_datetime: str) -> str:
     """Check calendar availability with error handling"""
     try:
-        if not hasattr(google_integration, 'calendar_service') or not google_integration.calendar_service:
+        if not google_integration.calendar_enabled:
             return "❌ Google Calendar not configured. Please check google-credentials.json"
         
-        result = google_integration.get_calendar_free_busy(start_datetime, end_datetime)
+        result = await google_integration.get_calendar_free_busy(
+            start_datetime, end_datetime
+        )
         
         if result["success"]:
             if result["is_free"]:
@@ -416,3 +473,47 @@ async def check_calendar_availability_web(start_datetime: str, end_datetime: str
     except Exception as e:
         logger.error(f"Calendar availability error: {e}")
         return f"❌ Error checking availability: {str(e)}"
+
+async def find_free_slots_web(start_datetime: str, end_datetime: str, duration_minutes: int = 60,
+                              calendars: str = "primary", working_hours: str = "09:00-17:00",
+                              max_results: int = 5, avoid_prayer_times: bool = True) -> str:
+    """Find the earliest free meeting slots across calendars in one free/busy lookup"""
+    try:
+        if not google_integration.calendar_enabled:
+            return "❌ Google Calendar not configured. Please check google-credentials.json"
+        
+        range_start = parse_datetime(start_datetime)
+        range_end = parse_datetime(end_datetime)
+        calendar_ids = [calendar.strip() for calendar in calendars.split(',') if calendar.strip()]
+        
+        result = await google_integration.get_calendar_free_busy(
+            range_start.isoformat(), range_end.isoformat(), calendar_ids=calendar_ids
+        )
+        
+        if not result["success"]:
+            error = result['error']
+            if "403" in str(error):
+                return "❌ Calendar API access denied. Check permissions"
+            return f"❌ Failed to check availability: {error}"
+        
+        busy = [(parse_datetime(busy["start"]), parse_datetime(busy["end"])) for busy in result["busy_times"]]
+        slots = find_free_slots(
+            busy, range_start, range_end,
+            duration=timedelta(minutes=duration_minutes),
+            max_results=max_results,
+            working_hours=parse_windows(working_hours)[0],
+            avoid_prayer_times=avoid_prayer_times
+        )
+        
+        if not slots:
+            return f"❌ No free {duration_minutes}-minute slots between {start_datetime} and {end_datetime}"
+        
+        response = f"📅 Free {duration_minutes}-minute slots ({len(slots)} found):\n"
+        for start, end in slots:
+            start = start.astimezone(CALENDAR_TIMEZONE)
+            end = end.astimezone(CALENDAR_TIMEZONE)
+            response += f"• {start.strftime('%a %d %b %H:%M')} - {end.strftime('%H:%M')}\n"
+        return response
+    except Exception as e:
+        logger.error(f"Free slot search error: {e}")
+        return f"❌ Error finding free slots: {str(e)}"
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+OUTBOX_PATH = os.getenv("WRITE_OUTBOX_PATH", os.path.join(tempfile.gettempdir(), "super_agent_outbox.db"))
+# Repeating the same write within this many seconds returns the first result
+OUTBOX_WINDOW = float(os.getenv("WRITE_OUTBOX_WINDOW", "600"))
+# How long another process's in-flight write is waited on before it is presumed dead
+OUTBOX_INFLIGHT_WAIT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    key TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    token TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def normalize(value: Any) -> Any:
+    """Canonical form of write arguments: whitespace collapsed, keys sorted
+
+    Case is kept, since writes that differ only in case are different writes.
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+class WriteOutbox:
+    def __init__(self, path: str = OUTBOX_PATH, window: float = OUTBOX_WINDOW):
+        """Idempotency layer for upstream creates, keyed by a content hash of the arguments
+
+        Every write is recorded as pending before the upstream call and as done after it.
+        A repeat inside the window returns the recorded result. If the first attempt's
+        outcome is unknown (timeout, 5xx), `reconcile` looks upstream before writing again.
+        """
+        self.path = path
+        self.window = window
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._last_purge = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.executescript(SCHEMA)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    @staticmethod
+    def key(operation: str, args: Dict[str, Any]) -> str:
+        canonical = json.dumps([operation, normalize(args)], separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _entry(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT status, token, result, created, updated FROM outbox WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"status": row[0], "token": row[1], "result": json.loads(row[2]) if row[2] else None,
+                "created": row[3], "updated": row[4]}
+
+    def _write(self, key: str, operation: str, token: str, status: str,
+               result: Any = None, created: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO outbox (key, operation, token, status, result, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, operation, token, status, json.dumps(result) if result is not None else None,
+                 created or now, now)
+            )
+            db.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM outbox WHERE key = ?", (key,))
+            db.commit()
+
+    def purge(self):
+        """Drop entries older than the window"""
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM outbox WHERE created < ?", (time.time() - self.window,))
+            db.commit()
+
+    async def run(self, operation: str, args: Dict[str, Any],
+                  call: Callable[[str], Awaitable[Any]],
+                  reconcile: Optional[Callable[[str, float], Awaitable[Any]]] = None) -> Any:
+        """Perform `call(token)` at most once per window for these arguments
+
+        `token` is stable across retries of the same write, so upstreams that accept a
+        client-chosen id can dedupe too. `reconcile(token, started)` returns the upstream
+        record if an earlier attempt of unknown outcome did land, else None.
+        The result must be JSON-serializable.
+        """
+        key = self.key(operation, args)
+        shared = self._inflight.get(key)
+        if shared is not None and not shared.done() and shared.get_loop() is asyncio.get_running_loop():
+            return await asyncio.shield(shared)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run(key, operation, call, reconcile)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            # Nobody else awaited it; don't warn about an unretrieved exception
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    async def _run(self, key: str, operation: str, call, reconcile) -> Any:
+        now = time.time()
+        if now - self._last_purge > self.window:
+            self._last_purge = now
+            self.purge()
+        entry = self._entry(key)
+        if entry and now - entry["created"] > self.window:
+            entry = None
+
+        # Another process may be mid-write; give it a chance to finish
+        deadline = now + OUTBOX_INFLIGHT_WAIT
+        while (entry and entry["status"] == "pending" and time.time() < deadline
+               and time.time() - entry["updated"] < OUTBOX_INFLIGHT_WAIT):
+            await asyncio.sleep(0.25)
+            entry = self._entry(key)
+
+        if entry and entry["status"] == "done":
+            logger.info(f"Outbox: returning earlier result for {operation}")
+            return entry["result"]
+
+        if entry and reconcile is not None:
+            # An earlier attempt may have landed upstream even though it never reported back
+            found = await reconcile(entry["token"], entry["created"])
+            if found is not None:
+                logger.info(f"Outbox: reconciled earlier {operation} upstream")
+                self._write(key, operation, entry["token"], "done", found, entry["created"])
+                return found
+
+        token = entry["token"] if entry else hashlib.sha256(f"{key}:{now}".encode()).hexdigest()
+        created = entry["created"] if entry else now
+        self._write(key, operation, token, "pending", created=created)
+        try:
+            result = await call(token)
+        except BaseException as e:
+            status = getattr(e, "status", None)
+            if isinstance(status, int) and status < 500 and status != 429:
+                # Rejected outright, so nothing was written; allow a clean retry
+                self._delete(key)
+            else:
+                self._write(key, operation, token, "unknown", created=created)
+            raise
+        self._write(key, operation, token, "done", result, created)
+        return result
+
+# Initialize global instance
+outbox = WriteOutbox()